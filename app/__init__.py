@@ -8,6 +8,10 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     
+    # JSON com orjson (quando instalado) e registros pré-codificados por versão do dataset
+    from app.utils.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+    
     # Configurar CORS
     CORS(app)
     
@@ -64,6 +68,8 @@ def create_app():
     from app.routes.comercializacao_routes import comercializacao_bp
     from app.routes.importacao_routes import importacao_bp
     from app.routes.exportacao_routes import exportacao_bp
+    from app.routes.dataset_routes import dataset_bp
+    from app.routes.cruzamento_routes import cruzamento_bp
     from app.routes.auth_routes import auth_bp
     
     app.register_blueprint(producao_bp, url_prefix='/api/v1')
@@ -71,6 +77,25 @@ def create_app():
     app.register_blueprint(comercializacao_bp, url_prefix='/api/v1')
     app.register_blueprint(importacao_bp, url_prefix='/api/v1')
     app.register_blueprint(exportacao_bp, url_prefix='/api/v1')
+    app.register_blueprint(dataset_bp, url_prefix='/api/v1')
+    app.register_blueprint(cruzamento_bp, url_prefix='/api/v1')
     app.register_blueprint(auth_bp, url_prefix='/api/v1')
     
+    # Comandos CLI (flask embrapa warm)
+    from app.cli import embrapa_cli
+    app.cli.add_command(embrapa_cli)
+    
+    # Aquecimento de todos os datasets antes de aceitar requisições
+    if app.config['DATASET_WARM_ON_STARTUP']:
+        from app.services.embrapa_service import EmbrapaService
+        with app.app_context():
+            EmbrapaService().refresh_all()
+    
+    # Renovação periódica dos datasets em segundo plano
+    if app.config['DATASET_REFRESH_ENABLED']:
+        from app.services.dataset_refresher import DatasetRefresher
+        refresher = DatasetRefresher(app)
+        app.extensions['dataset_refresher'] = refresher
+        refresher.start()
+    
     return app 
\ No newline at end of file
@@ -0,0 +1,29 @@
+import time
+import click
+from flask.cli import AppGroup
+from app.services.embrapa_service import EmbrapaService
+from app.services.dataset_store import dataset_store
+
+embrapa_cli = AppGroup('embrapa', help='Comandos de manutenção dos dados da Embrapa')
+
+@embrapa_cli.command('warm')
+@click.option('--workers', type=int, default=None, help='Downloads simultâneos (padrão: DATASET_REFRESH_WORKERS)')
+@click.argument('datasets', nargs=-1)
+def warm(workers, datasets):
+    """Baixa e processa em paralelo todos os datasets (ou apenas os informados)"""
+    service = EmbrapaService()
+    
+    unknown = [name for name in datasets if name not in service.endpoint_mapping]
+    if unknown:
+        raise click.BadParameter(f"Datasets desconhecidos: {', '.join(unknown)}")
+    
+    start = time.perf_counter()
+    results = service.refresh_all(datasets or None, max_workers=workers)
+    elapsed = time.perf_counter() - start
+    
+    stats = dataset_store.stats()
+    for endpoint in sorted(results):
+        info = stats.get(endpoint, {})
+        status = 'ok' if results[endpoint] else 'fallback'
+        click.echo(f"{endpoint:<16} {status:<9} fonte={info.get('source')} registros={info.get('records')}")
+    click.echo(f"{len(results)} datasets aquecidos em {elapsed:.2f}s")
@@ -3,6 +3,19 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+DATASETS = ('producao', 'processamento', 'comercializacao', 'importacao', 'exportacao')
+
+def per_dataset(prefix, default, cast=int):
+    """Lê uma configuração por dataset (ex.: CACHE_TIMEOUT_PRODUCAO), com valor padrão"""
+    return {
+        name: cast(os.environ.get(f'{prefix}_{name.upper()}', default))
+        for name in DATASETS
+    }
+
+def env_flag(name, default='false'):
+    """Lê uma variável de ambiente booleana"""
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
@@ -11,10 +24,48 @@ class Config:
     # URLs da Embrapa 
     EMBRAPA_BASE_URL = os.environ.get('EMBRAPA_BASE_URL', 'http://vitibrasil.cnpuv.embrapa.br')
     
+    # Downloads da Embrapa (timeout em segundos, retries com backoff exponencial, conexões por host)
+    EMBRAPA_TIMEOUT = float(os.environ.get('EMBRAPA_TIMEOUT', 30))
+    EMBRAPA_MAX_RETRIES = int(os.environ.get('EMBRAPA_MAX_RETRIES', 2))
+    EMBRAPA_RETRY_BACKOFF = float(os.environ.get('EMBRAPA_RETRY_BACKOFF', 0.5))
+    EMBRAPA_POOL_SIZE = int(os.environ.get('EMBRAPA_POOL_SIZE', 10))
+    
+    # Circuit breaker por dataset: falhas seguidas até abrir e espera (segundos) antes de testar
+    # novamente, dobrando a cada nova falha até o máximo
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD', 3))
+    CIRCUIT_BREAKER_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_BREAKER_RESET_TIMEOUT', 30))
+    CIRCUIT_BREAKER_MAX_TIMEOUT = float(os.environ.get('CIRCUIT_BREAKER_MAX_TIMEOUT', 600))
+    
     # Cache settings
     CACHE_TYPE = os.environ.get('CACHE_TYPE', 'simple')
     CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))
     
+    # TTL (segundos) de cada dataset em memória; usa CACHE_DEFAULT_TIMEOUT quando não definido
+    CACHE_TIMEOUTS = per_dataset('CACHE_TIMEOUT', CACHE_DEFAULT_TIMEOUT)
+    
+    # Continua servindo o último snapshot válido enquanto o dataset é renovado em segundo plano
+    DATASET_STALE_WHILE_REVALIDATE = env_flag('DATASET_STALE_WHILE_REVALIDATE', 'true')
+    
+    # Renovação periódica em segundo plano (intervalo e jitter em segundos, por dataset)
+    DATASET_REFRESH_ENABLED = env_flag('DATASET_REFRESH_ENABLED')
+    DATASET_REFRESH_INTERVALS = per_dataset('DATASET_REFRESH_INTERVAL', os.environ.get('DATASET_REFRESH_INTERVAL', CACHE_DEFAULT_TIMEOUT))
+    DATASET_REFRESH_JITTER = per_dataset('DATASET_REFRESH_JITTER', os.environ.get('DATASET_REFRESH_JITTER', 30), cast=float)
+    
+    # Downloads simultâneos ao renovar vários datasets; aquecimento de todos na inicialização
+    DATASET_REFRESH_WORKERS = int(os.environ.get('DATASET_REFRESH_WORKERS', 5))
+    DATASET_WARM_ON_STARTUP = env_flag('DATASET_WARM_ON_STARTUP')
+    
+    # Modo compartilhado entre workers (gunicorn): os datasets vêm dos snapshots mapeados em memória,
+    # cada worker verifica a geração em disco a cada DATASET_SHARED_CHECK_INTERVAL segundos e apenas
+    # um processo por host baixa e renova os dados
+    DATASET_SHARED_MODE = env_flag('DATASET_SHARED_MODE')
+    DATASET_SHARED_CHECK_INTERVAL = float(os.environ.get('DATASET_SHARED_CHECK_INTERVAL', 1))
+    
+    # Cache LRU das respostas das rotas de dados, por consulta normalizada e versão dos datasets
+    RESPONSE_CACHE_ENABLED = env_flag('RESPONSE_CACHE_ENABLED', 'true')
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 512))
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    
     # Rate limiting
     RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
     
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 from app.services.embrapa_service import EmbrapaService
-from app.utils.pagination import get_pagination_params, paginate_data, get_filter_params
+from app.utils.pagination import get_pagination_params, paginate_request, get_filter_params, InvalidParameter
+from app.utils.http import catalog_response, cached_response
 from app.utils.auth import optional_token
 from flasgger import swag_from
 
@@ -8,6 +9,7 @@ comercializacao_bp = Blueprint('comercializacao', __name__)
 
 @comercializacao_bp.route('/comercializacao', methods=['GET'])
 @optional_token
+@cached_response('comercializacao')
 @swag_from({
     'tags': ['Comercialização'],
     'summary': 'Obter dados de comercialização',
@@ -15,8 +17,17 @@ comercializacao_bp = Blueprint('comercializacao', __name__)
     'parameters': [
         {'name': 'page', 'in': 'query', 'type': 'integer', 'description': 'Número da página'},
         {'name': 'per_page', 'in': 'query', 'type': 'integer', 'description': 'Itens por página'},
-        {'name': 'ano', 'in': 'query', 'type': 'integer', 'description': 'Filtrar por ano'},
-        {'name': 'produto', 'in': 'query', 'type': 'string', 'description': 'Filtrar por produto'}
+        {'name': 'cursor', 'in': 'query', 'type': 'string', 'description': 'Paginação por cursor (vazio na primeira página)'},
+        {'name': 'count', 'in': 'query', 'type': 'boolean', 'description': 'Com cursor, força o cálculo do total'},
+        {'name': 'sort', 'in': 'query', 'type': 'string', 'description': 'Ordenação (ex.: -quantidade,ano)'},
+        {'name': 'fields', 'in': 'query', 'type': 'string', 'description': 'Campos retornados (ex.: ano,quantidade)'},
+        {'name': 'compact', 'in': 'query', 'type': 'boolean', 'description': 'Envia unidade uma única vez, em constantes'},
+        {'name': 'ano', 'in': 'query', 'type': 'string', 'description': 'Filtrar por ano (aceita vários, separados por vírgula)'},
+        {'name': 'ano_inicio', 'in': 'query', 'type': 'integer', 'description': 'Primeiro ano do intervalo'},
+        {'name': 'ano_fim', 'in': 'query', 'type': 'integer', 'description': 'Último ano do intervalo'},
+        {'name': 'produto', 'in': 'query', 'type': 'string', 'description': 'Filtrar por produto (aceita vários, separados por vírgula)'},
+        {'name': 'categoria', 'in': 'query', 'type': 'string', 'description': 'Filtrar pela categoria do CSV (ex.: ESPUMANTES)'},
+        {'name': 'subtotal', 'in': 'query', 'type': 'boolean', 'description': 'false: só os itens; true: só os subtotais de cada categoria'}
     ],
     'responses': {200: {'description': 'Dados de comercialização'}}
 })
@@ -28,14 +39,46 @@ def get_comercializacao():
         
         data = service.get_data('comercializacao')
         
-        if filters.get('ano'):
-            data = [item for item in data if item.get('ano') == filters['ano']]
+        result = paginate_request(data, filters, page, per_page)
+        return jsonify(result), 200
         
-        if filters.get('produto'):
-            data = [item for item in data if filters['produto'].lower() in item.get('produto', '').lower()]
+    except InvalidParameter as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@comercializacao_bp.route('/comercializacao/anos', methods=['GET'])
+@optional_token
+@swag_from({
+    'tags': ['Comercialização'],
+    'summary': 'Obter anos disponíveis',
+    'description': 'Retorna lista de anos disponíveis nos dados de comercialização, com contagem de registros por ano',
+    'responses': {200: {'description': 'Anos disponíveis'}, 304: {'description': 'Catálogo inalterado (If-None-Match)'}}
+})
+def get_comercializacao_anos():
+    try:
+        service = EmbrapaService()
+        data = service.get_data('comercializacao')
         
-        result = paginate_data(data, page, per_page)
-        return jsonify(result), 200
+        return catalog_response(data.catalog, 'anos')
+        
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
+
+@comercializacao_bp.route('/comercializacao/produtos', methods=['GET'])
+@optional_token
+@swag_from({
+    'tags': ['Comercialização'],
+    'summary': 'Obter produtos disponíveis',
+    'description': 'Retorna lista de produtos disponíveis nos dados de comercialização, com contagem de registros e cobertura de anos',
+    'responses': {200: {'description': 'Produtos disponíveis'}, 304: {'description': 'Catálogo inalterado (If-None-Match)'}}
+})
+def get_comercializacao_produtos():
+    try:
+        service = EmbrapaService()
+        data = service.get_data('comercializacao')
+        
+        return catalog_response(data.catalog, 'produtos')
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
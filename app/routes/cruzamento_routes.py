@@ -0,0 +1,183 @@
+from flask import Blueprint, jsonify
+from app.services.embrapa_service import EmbrapaService
+from app.services.dataset_join import JOINS, get_join
+from app.utils.pagination import get_pagination_params, paginate_data, get_filter_params
+from app.utils.http import cached_response
+from app.utils.auth import optional_token
+from flasgger import swag_from
+
+cruzamento_bp = Blueprint('cruzamento', __name__)
+
+def join_parameters(key_field, description, categories=False):
+    parameters = [
+        {
+            'name': 'page',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Número da página (padrão: 1)'
+        },
+        {
+            'name': 'per_page',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Itens por página (padrão: 50, máximo: 1000)'
+        },
+        {
+            'name': 'ano',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Filtrar por ano (aceita vários, separados por vírgula)'
+        },
+        {
+            'name': 'ano_inicio',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Primeiro ano do intervalo'
+        },
+        {
+            'name': 'ano_fim',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Último ano do intervalo'
+        },
+        {
+            'name': key_field,
+            'in': 'query',
+            'type': 'string',
+            'description': description
+        },
+        {
+            'name': 'Authorization',
+            'in': 'header',
+            'type': 'string',
+            'description': 'Bearer token (opcional)'
+        }
+    ]
+    if categories:
+        parameters.insert(-1, {
+            'name': 'categoria',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Filtrar pela categoria (aceita várias, separadas por vírgula)'
+        })
+    return parameters
+
+def join_response(name):
+    """Filtra e pagina o cruzamento, calculado uma vez por par de versões dos datasets"""
+    spec = JOINS[name]
+    service = EmbrapaService()
+    page, per_page = get_pagination_params()
+    filters = get_filter_params()
+
+    left = service.get_data(spec['left'])
+    right = service.get_data(spec['right'])
+    joined = get_join(name, left, right)
+
+    data = joined.select(
+        anos=filters.get('ano'),
+        ano_inicio=filters.get('ano_inicio'),
+        ano_fim=filters.get('ano_fim'),
+        entidade=filters.get(spec['key_field']),
+        categoria=filters.get('categoria')
+    )
+
+    result = paginate_data(data, page, per_page)
+    result['constantes'] = spec['constants']
+    return result
+
+@cruzamento_bp.route('/producao-comercializacao', methods=['GET'])
+@optional_token
+@cached_response('producao', 'comercializacao')
+@swag_from({
+    'tags': ['Cruzamentos'],
+    'summary': 'Produção x comercialização por produto e ano',
+    'description': (
+        'Cruza produção e comercialização pela categoria e o nome do produto (sem acentos e maiúsculas) e ano. '
+        'Os subtotais de categoria ficam de fora e um lado sem dado conta como zero'
+    ),
+    'parameters': join_parameters('produto', 'Filtrar por produto (aceita vários, separados por vírgula)', categories=True),
+    'responses': {
+        200: {
+            'description': 'Cruzamento calculado',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'data': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'produto': {'type': 'string'},
+                                'categoria': {'type': 'string'},
+                                'ano': {'type': 'integer'},
+                                'producao': {'type': 'integer'},
+                                'comercializacao': {'type': 'integer'},
+                                'diferenca': {'type': 'integer', 'description': 'Produção - comercialização'}
+                            }
+                        }
+                    },
+                    'constantes': {'type': 'object'},
+                    'pagination': {'type': 'object'}
+                }
+            }
+        },
+        500: {
+            'description': 'Erro interno do servidor'
+        }
+    }
+})
+def get_producao_comercializacao():
+    """Endpoint para cruzar produção e comercialização"""
+    try:
+        return jsonify(join_response('producao-comercializacao')), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
+
+@cruzamento_bp.route('/balanca-comercial', methods=['GET'])
+@optional_token
+@cached_response('exportacao', 'importacao')
+@swag_from({
+    'tags': ['Cruzamentos'],
+    'summary': 'Balança comercial por país e ano',
+    'description': 'Cruza exportação e importação pelo país (sem acentos e maiúsculas) e ano e calcula o saldo. Um lado sem dado conta como zero',
+    'parameters': join_parameters('pais', 'Filtrar por país (aceita vários, separados por vírgula)'),
+    'responses': {
+        200: {
+            'description': 'Balança comercial calculada',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'data': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'pais': {'type': 'string'},
+                                'ano': {'type': 'integer'},
+                                'exportacao_quantidade': {'type': 'integer'},
+                                'exportacao_valor': {'type': 'integer'},
+                                'importacao_quantidade': {'type': 'integer'},
+                                'importacao_valor': {'type': 'integer'},
+                                'saldo_quantidade': {'type': 'integer', 'description': 'Exportação - importação (kg)'},
+                                'saldo_valor': {'type': 'integer', 'description': 'Exportação - importação (US$)'}
+                            }
+                        }
+                    },
+                    'constantes': {'type': 'object'},
+                    'pagination': {'type': 'object'}
+                }
+            }
+        },
+        500: {
+            'description': 'Erro interno do servidor'
+        }
+    }
+})
+def get_balanca_comercial():
+    """Endpoint para a balança comercial (exportação - importação)"""
+    try:
+        return jsonify(join_response('balanca-comercial')), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
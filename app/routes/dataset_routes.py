@@ -0,0 +1,585 @@
+from flask import Blueprint, jsonify, request
+from app.services.embrapa_service import EmbrapaService, DATASET_REGISTRY
+from app.services.dataset_rollup import AGGREGATIONS
+from app.services.dataset_series import DEFAULT_WINDOW
+from app.services.dataset_ranking import MAX_RANKING_SIZE
+from app.utils.pagination import get_pagination_params, get_filter_params, paginate_data, paginate_request, select_rows, InvalidParameter
+from app.utils.http import cached_response
+from app.utils.auth import optional_token
+from flasgger import swag_from
+
+dataset_bp = Blueprint('dataset', __name__)
+
+DATASET_PARAMETER = {
+    'name': 'dataset',
+    'in': 'path',
+    'type': 'string',
+    'required': True,
+    'enum': list(DATASET_REGISTRY),
+    'description': 'Dataset consultado'
+}
+
+AUTHORIZATION_PARAMETER = {
+    'name': 'Authorization',
+    'in': 'header',
+    'type': 'string',
+    'description': 'Bearer token (opcional)'
+}
+
+FILTER_PARAMETERS = [
+    {
+        'name': 'ano',
+        'in': 'query',
+        'type': 'string',
+        'description': 'Filtrar por ano (aceita vários, separados por vírgula)'
+    },
+    {
+        'name': 'ano_inicio',
+        'in': 'query',
+        'type': 'integer',
+        'description': 'Primeiro ano do intervalo'
+    },
+    {
+        'name': 'ano_fim',
+        'in': 'query',
+        'type': 'integer',
+        'description': 'Último ano do intervalo'
+    },
+    {
+        'name': 'produto',
+        'in': 'query',
+        'type': 'string',
+        'description': 'Filtrar por produto (producao, comercializacao)'
+    },
+    {
+        'name': 'cultivar',
+        'in': 'query',
+        'type': 'string',
+        'description': 'Filtrar por cultivar (processamento)'
+    },
+    {
+        'name': 'pais',
+        'in': 'query',
+        'type': 'string',
+        'description': 'Filtrar por país (importacao, exportacao)'
+    },
+    {
+        'name': 'categoria',
+        'in': 'query',
+        'type': 'string',
+        'description': 'Filtrar pela categoria do CSV (producao, processamento, comercializacao)'
+    },
+    {
+        'name': 'subtotal',
+        'in': 'query',
+        'type': 'boolean',
+        'description': 'false: só os itens; true: só os subtotais de cada categoria (producao, processamento, comercializacao)'
+    }
+]
+
+MAX_SEARCH_LIMIT = 50
+MAX_SERIES_WINDOW = 20
+
+def dataset_not_found(dataset):
+    return jsonify({'message': f'Dataset não encontrado: {dataset}'}), 404
+
+@dataset_bp.route('/<dataset>/search', methods=['GET'])
+@optional_token
+@cached_response()
+@swag_from({
+    'tags': ['Busca'],
+    'summary': 'Autocomplete de produtos, cultivares e países',
+    'description': 'Retorna os nomes do dataset que contêm o texto informado, começando pelos que iniciam com ele',
+    'parameters': [
+        DATASET_PARAMETER,
+        {
+            'name': 'q',
+            'in': 'query',
+            'type': 'string',
+            'required': True,
+            'description': 'Texto buscado (sem diferenciar maiúsculas)'
+        },
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'description': f'Quantidade máxima de sugestões (padrão: 10, máximo: {MAX_SEARCH_LIMIT})'
+        },
+        AUTHORIZATION_PARAMETER
+    ],
+    'responses': {
+        200: {
+            'description': 'Sugestões encontradas',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'q': {'type': 'string'},
+                    'campo': {'type': 'string', 'description': 'Campo dos registros a que os nomes se referem'},
+                    'sugestoes': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'nome': {'type': 'string'},
+                                'registros': {'type': 'integer'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Parâmetro q ausente'
+        },
+        404: {
+            'description': 'Dataset não encontrado'
+        }
+    }
+})
+def search_dataset(dataset):
+    """Endpoint de autocomplete sobre o índice de nomes do dataset"""
+    if dataset not in DATASET_REGISTRY:
+        return dataset_not_found(dataset)
+
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'message': 'O parâmetro q é obrigatório'}), 400
+
+    limit = request.args.get('limit', 10, type=int)
+    limit = min(max(1, limit), MAX_SEARCH_LIMIT)
+
+    try:
+        service = EmbrapaService()
+        data = service.get_data(dataset)
+
+        sugestoes = [
+            {'nome': name, 'registros': count}
+            for name, count in data.index.search(q, limit)
+        ]
+
+        return jsonify({'q': q, 'campo': data.entity_field, 'sugestoes': sugestoes}), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
+
+@dataset_bp.route('/<dataset>/agregado', methods=['GET'])
+@optional_token
+@cached_response()
+@swag_from({
+    'tags': ['Análises'],
+    'summary': 'Agregados por ano, década, entidade ou categoria',
+    'description': 'Retorna totais, médias, mínimos ou máximos agrupados, calculados a partir de rollups pré-computados a cada atualização do dataset. Os subtotais de categoria do CSV ficam de fora',
+    'parameters': [
+        DATASET_PARAMETER,
+        {
+            'name': 'group_by',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Dimensões separadas por vírgula: ano, decada, produto/cultivar/pais e categoria (producao, processamento, comercializacao) (padrão: ano; no máximo duas)'
+        },
+        {
+            'name': 'agg',
+            'in': 'query',
+            'type': 'string',
+            'enum': list(AGGREGATIONS),
+            'description': 'Agregação aplicada às métricas (padrão: sum)'
+        },
+        {
+            'name': 'metric',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Métricas separadas por vírgula (padrão: todas; quantidade e, em importação/exportação, valor)'
+        },
+        *FILTER_PARAMETERS,
+        AUTHORIZATION_PARAMETER
+    ],
+    'responses': {
+        200: {
+            'description': 'Agregados calculados',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'group_by': {'type': 'array', 'items': {'type': 'string'}},
+                    'agg': {'type': 'string'},
+                    'data': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'description': 'Valores das dimensões, das métricas agregadas e a quantidade de registros do grupo'
+                        }
+                    },
+                    'total': {'type': 'integer'}
+                }
+            }
+        },
+        400: {
+            'description': 'Parâmetros inválidos'
+        },
+        404: {
+            'description': 'Dataset não encontrado'
+        }
+    }
+})
+def aggregate_dataset(dataset):
+    """Endpoint de agregação servido pelos rollups do dataset"""
+    if dataset not in DATASET_REGISTRY:
+        return dataset_not_found(dataset)
+
+    try:
+        service = EmbrapaService()
+        data = service.get_data(dataset)
+        rollups = data.rollups
+
+        group_by = [value.strip() for value in request.args.get('group_by', 'ano').split(',') if value.strip()]
+        invalid = [value for value in group_by if value not in rollups.dimensions]
+        if invalid or not group_by or len(group_by) > 2 or len(set(group_by)) != len(group_by):
+            return jsonify({'message': f'group_by inválido; use até duas dimensões entre: {", ".join(rollups.dimensions)}'}), 400
+        if set(group_by) == {'ano', 'decada'}:
+            return jsonify({'message': 'group_by não pode combinar ano e decada'}), 400
+
+        agg = request.args.get('agg', 'sum')
+        if agg not in AGGREGATIONS:
+            return jsonify({'message': f'agg inválido; use um entre: {", ".join(AGGREGATIONS)}'}), 400
+
+        metrics = [value.strip() for value in request.args.get('metric', '').split(',') if value.strip()]
+        invalid = [value for value in metrics if value not in rollups.metrics]
+        if invalid:
+            return jsonify({'message': f'metric inválida; use: {", ".join(rollups.metrics)}'}), 400
+
+        rows = select_rows(data, get_filter_params())
+        result = rollups.aggregate(group_by, agg, metrics or None, rows)
+
+        return jsonify({'group_by': group_by, 'agg': agg, 'data': result, 'total': len(result)}), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
+
+@dataset_bp.route('/<dataset>/query', methods=['GET'])
+@optional_token
+@cached_response()
+@swag_from({
+    'tags': ['Consulta'],
+    'summary': 'Consulta genérica a qualquer dataset',
+    'description': (
+        'Aceita os filtros definidos para o dataset (ano, ano_inicio, ano_fim, produto/cultivar/pais, '
+        'categoria e subtotal nos datasets com categorias e <metrica>_min/<metrica>_max), além de paginação (page/per_page ou cursor), sort, fields e compact. '
+        'Os filtros viram um plano de execução, reaproveitado entre consultas com o mesmo formato, que usa '
+        'primeiro o índice mais seletivo'
+    ),
+    'parameters': [
+        DATASET_PARAMETER,
+        *FILTER_PARAMETERS,
+        {
+            'name': 'quantidade_min',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Quantidade mínima (o mesmo vale para quantidade_max, valor_min e valor_max)'
+        },
+        {
+            'name': 'page',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Número da página (padrão: 1)'
+        },
+        {
+            'name': 'per_page',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Itens por página (padrão: 50, máximo: 1000)'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Paginação por cursor (vazio na primeira página)'
+        },
+        {
+            'name': 'sort',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Ordenação (ex.: -quantidade,ano)'
+        },
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Campos retornados (ex.: ano,quantidade)'
+        },
+        AUTHORIZATION_PARAMETER
+    ],
+    'responses': {
+        200: {
+            'description': 'Registros da consulta, no mesmo formato das listagens, com os filtros interpretados em filtros'
+        },
+        400: {
+            'description': 'Filtro ou parâmetro inválido'
+        },
+        404: {
+            'description': 'Dataset não encontrado'
+        }
+    }
+})
+def query_dataset(dataset):
+    """Endpoint genérico de consulta, guiado pelo registro de datasets"""
+    spec = DATASET_REGISTRY.get(dataset)
+    if spec is None:
+        return dataset_not_found(dataset)
+
+    try:
+        filters = spec.parse(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        page, per_page = get_pagination_params()
+
+        service = EmbrapaService()
+        data = service.get_data(dataset)
+
+        result = paginate_request(data, filters, page, per_page)
+        result['filtros'] = filters
+
+        return jsonify(result), 200
+
+    except InvalidParameter as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
+
+@dataset_bp.route('/<dataset>/serie', methods=['GET'])
+@optional_token
+@cached_response()
+@swag_from({
+    'tags': ['Análises'],
+    'summary': 'Séries anuais por entidade com crescimento, média móvel e CAGR',
+    'description': (
+        'Retorna, para cada produto/cultivar/país com dado no intervalo, o valor de cada ano, o crescimento '
+        'em relação ao ano anterior (%), a média móvel e o CAGR (%) entre o primeiro e o último ano do intervalo. '
+        'Nos datasets com categorias cada série é de um item dentro da sua categoria, sem os subtotais de categoria. '
+        'Os indicadores são calculados uma vez por versão do dataset'
+    ),
+    'parameters': [
+        DATASET_PARAMETER,
+        {
+            'name': 'metric',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Métrica da série (padrão: quantidade; em importação/exportação também valor)'
+        },
+        {
+            'name': 'janela',
+            'in': 'query',
+            'type': 'integer',
+            'description': f'Anos da média móvel (padrão: {DEFAULT_WINDOW}, máximo: {MAX_SERIES_WINDOW})'
+        },
+        {
+            'name': 'ano_inicio',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Primeiro ano da série e do CAGR'
+        },
+        {
+            'name': 'ano_fim',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Último ano da série e do CAGR'
+        },
+        *[parameter for parameter in FILTER_PARAMETERS if parameter['name'] in ('produto', 'cultivar', 'pais', 'categoria')],
+        {
+            'name': 'page',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Número da página (padrão: 1)'
+        },
+        {
+            'name': 'per_page',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Entidades por página (padrão: 50, máximo: 1000)'
+        },
+        AUTHORIZATION_PARAMETER
+    ],
+    'responses': {
+        200: {
+            'description': 'Séries calculadas',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'metric': {'type': 'string'},
+                    'janela': {'type': 'integer'},
+                    'data': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'categoria': {'type': 'string', 'description': 'Categoria do item (producao, processamento, comercializacao)'},
+                                'cagr': {'type': 'number', 'description': 'Taxa de crescimento anual composta (%), nula quando o primeiro ano é zero'},
+                                'serie': {
+                                    'type': 'array',
+                                    'items': {
+                                        'type': 'object',
+                                        'properties': {
+                                            'ano': {'type': 'integer'},
+                                            'valor': {'type': 'integer'},
+                                            'crescimento': {'type': 'number', 'description': 'Variação (%) sobre o ano anterior'},
+                                            'media_movel': {'type': 'number'}
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    'pagination': {'type': 'object'}
+                }
+            }
+        },
+        400: {
+            'description': 'Parâmetros inválidos'
+        },
+        404: {
+            'description': 'Dataset não encontrado'
+        }
+    }
+})
+def series_dataset(dataset):
+    """Endpoint de séries temporais por entidade, servido pelos indicadores pré-calculados do dataset"""
+    if dataset not in DATASET_REGISTRY:
+        return dataset_not_found(dataset)
+
+    try:
+        service = EmbrapaService()
+        data = service.get_data(dataset)
+        series = data.series
+
+        metric = request.args.get('metric', series.metrics[0]).strip()
+        if metric not in series.metrics:
+            return jsonify({'message': f'metric inválida; use: {", ".join(series.metrics)}'}), 400
+
+        janela = request.args.get('janela', DEFAULT_WINDOW, type=int)
+        if not 1 <= janela <= MAX_SERIES_WINDOW:
+            return jsonify({'message': f'janela inválida; use um valor entre 1 e {MAX_SERIES_WINDOW}'}), 400
+
+        page, per_page = get_pagination_params()
+        filters = get_filter_params()
+
+        rows = series.series(
+            metric,
+            janela,
+            ano_inicio=filters.get('ano_inicio'),
+            ano_fim=filters.get('ano_fim'),
+            entidade=filters.get(data.entity_field),
+            categoria=filters.get('categoria')
+        )
+
+        result = paginate_data(rows, page, per_page)
+        result['metric'] = metric
+        result['janela'] = janela
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
+
+@dataset_bp.route('/<dataset>/ranking', methods=['GET'])
+@optional_token
+@cached_response()
+@swag_from({
+    'tags': ['Análises'],
+    'summary': 'Ranking (top N) de produtos, cultivares ou países em um ano',
+    'description': (
+        'Retorna as N entidades com maior valor da métrica no ano, com a participação de cada uma no total do ano. '
+        'Nos datasets com categorias cada item é ranqueado dentro da sua categoria e os subtotais de categoria '
+        'ficam fora do ranking e do total do ano. O ranking de cada ano e métrica é calculado uma vez por versão do dataset'
+    ),
+    'parameters': [
+        DATASET_PARAMETER,
+        {
+            'name': 'ano',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Ano do ranking (padrão: o mais recente com dado na métrica)'
+        },
+        {
+            'name': 'n',
+            'in': 'query',
+            'type': 'integer',
+            'description': f'Tamanho do ranking (padrão: 10, máximo: {MAX_RANKING_SIZE})'
+        },
+        {
+            'name': 'metric',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Métrica ordenada (padrão: quantidade; em importação/exportação também valor)'
+        },
+        AUTHORIZATION_PARAMETER
+    ],
+    'responses': {
+        200: {
+            'description': 'Ranking calculado',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'ano': {'type': 'integer'},
+                    'metric': {'type': 'string'},
+                    'n': {'type': 'integer'},
+                    'total_ano': {'type': 'integer', 'description': 'Soma da métrica no ano, entre todos os itens (sem subtotais)'},
+                    'data': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'posicao': {'type': 'integer'},
+                                'categoria': {'type': 'string', 'description': 'Categoria do item (producao, processamento, comercializacao)'},
+                                'participacao': {'type': 'number', 'description': 'Participação (%) no total do ano'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Parâmetros inválidos'
+        },
+        404: {
+            'description': 'Dataset ou ano não encontrado'
+        }
+    }
+})
+def ranking_dataset(dataset):
+    """Endpoint de ranking por ano, servido pelos tops pré-selecionados do dataset"""
+    if dataset not in DATASET_REGISTRY:
+        return dataset_not_found(dataset)
+
+    try:
+        service = EmbrapaService()
+        data = service.get_data(dataset)
+        ranking = data.ranking
+
+        metric = request.args.get('metric', ranking.metrics[0]).strip()
+        if metric not in ranking.metrics:
+            return jsonify({'message': f'metric inválida; use: {", ".join(ranking.metrics)}'}), 400
+
+        n = request.args.get('n', 10, type=int)
+        n = min(max(1, n), MAX_RANKING_SIZE)
+
+        # Sem ano, vale o mais recente com dado na métrica (um ano recém-aberto no CSV pode vir zerado)
+        ano = request.args.get('ano', type=int)
+        if ano is None:
+            ano = ranking.latest_year(metric)
+            if ano is None:
+                return jsonify({'message': f'Dataset sem dados para a métrica {metric}'}), 404
+        if ano not in ranking.years:
+            return jsonify({'message': f'Ano não encontrado: {ano}'}), 404
+
+        _, total = ranking.top(ano, metric)
+
+        return jsonify({
+            'ano': ano,
+            'metric': metric,
+            'n': n,
+            'total_ano': total,
+            'data': ranking.ranking(ano, metric, n)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 from app.services.embrapa_service import EmbrapaService
-from app.utils.pagination import get_pagination_params, paginate_data, get_filter_params
+from app.utils.pagination import get_pagination_params, paginate_request, get_filter_params, InvalidParameter
+from app.utils.http import catalog_response, cached_response
 from app.utils.auth import optional_token
 from flasgger import swag_from
 
@@ -8,6 +9,7 @@ exportacao_bp = Blueprint('exportacao', __name__)
 
 @exportacao_bp.route('/exportacao', methods=['GET'])
 @optional_token
+@cached_response('exportacao')
 @swag_from({
     'tags': ['Exportação'],
     'summary': 'Obter dados de exportação',
@@ -25,17 +27,59 @@ exportacao_bp = Blueprint('exportacao', __name__)
             'type': 'integer',
             'description': 'Itens por página (padrão: 50, máximo: 1000)'
         },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Paginação por cursor: vazio na primeira página, depois o next_cursor da resposta anterior (ignora page)'
+        },
+        {
+            'name': 'count',
+            'in': 'query',
+            'type': 'boolean',
+            'description': 'Com cursor, calcula o total mesmo quando ele exige a interseção de filtros (padrão: false)'
+        },
+        {
+            'name': 'sort',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Ordenação por campos separados por vírgula; prefixo - para decrescente (ex.: -quantidade,ano)'
+        },
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Campos retornados em cada registro, separados por vírgula (ex.: ano,quantidade)'
+        },
+        {
+            'name': 'compact',
+            'in': 'query',
+            'type': 'boolean',
+            'description': 'Envia os campos constantes do dataset (unidade, tipo) uma única vez, em constantes (padrão: false)'
+        },
         {
             'name': 'ano',
             'in': 'query',
+            'type': 'string',
+            'description': 'Filtrar por ano (aceita vários, separados por vírgula)'
+        },
+        {
+            'name': 'ano_inicio',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Primeiro ano do intervalo'
+        },
+        {
+            'name': 'ano_fim',
+            'in': 'query',
             'type': 'integer',
-            'description': 'Filtrar por ano'
+            'description': 'Último ano do intervalo'
         },
         {
             'name': 'pais',
             'in': 'query',
             'type': 'string',
-            'description': 'Filtrar por país de destino'
+            'description': 'Filtrar por país de destino (aceita vários, separados por vírgula)'
         },
         {
             'name': 'Authorization',
@@ -57,12 +101,17 @@ exportacao_bp = Blueprint('exportacao', __name__)
                             'properties': {
                                 'ano': {'type': 'integer'},
                                 'pais': {'type': 'string'},
-                                'quantidade': {'type': 'integer'},
+                                'quantidade': {'type': 'integer', 'description': 'Quantidade (kg)'},
+                                'valor': {'type': 'integer', 'description': 'Valor (US$)'},
                                 'unidade': {'type': 'string'},
                                 'tipo': {'type': 'string'}
                             }
                         }
                     },
+                    'constantes': {
+                        'type': 'object',
+                        'description': 'Campos constantes do dataset (somente com compact=true)'
+                    },
                     'pagination': {
                         'type': 'object',
                         'properties': {
@@ -71,7 +120,9 @@ exportacao_bp = Blueprint('exportacao', __name__)
                             'total': {'type': 'integer'},
                             'pages': {'type': 'integer'},
                             'has_prev': {'type': 'boolean'},
-                            'has_next': {'type': 'boolean'}
+                            'has_next': {'type': 'boolean'},
+                            'cursor': {'type': 'string', 'description': 'Somente na paginação por cursor'},
+                            'next_cursor': {'type': 'string', 'description': 'Somente na paginação por cursor'}
                         }
                     }
                 }
@@ -91,16 +142,12 @@ def get_exportacao():
         
         data = service.get_data('exportacao')
         
-        if filters.get('ano'):
-            data = [item for item in data if item.get('ano') == filters['ano']]
-        
-        if filters.get('pais'):
-            data = [item for item in data if filters['pais'].lower() in item.get('pais', '').lower()]
-        
-        result = paginate_data(data, page, per_page)
+        result = paginate_request(data, filters, page, per_page)
         
         return jsonify(result), 200
         
+    except InvalidParameter as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
 
@@ -127,9 +174,23 @@ def get_exportacao():
                     'anos': {
                         'type': 'array',
                         'items': {'type': 'integer'}
+                    },
+                    'detalhes': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'ano': {'type': 'integer'},
+                                'registros': {'type': 'integer'},
+                                'entidades': {'type': 'integer'}
+                            }
+                        }
                     }
                 }
             }
+        },
+        304: {
+            'description': 'Catálogo inalterado (If-None-Match)'
         }
     }
 })
@@ -139,9 +200,7 @@ def get_exportacao_anos():
         service = EmbrapaService()
         data = service.get_data('exportacao')
         
-        anos = sorted(list(set(item.get('ano') for item in data if item.get('ano'))))
-        
-        return jsonify({'anos': anos}), 200
+        return catalog_response(data.catalog, 'anos')
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
@@ -169,9 +228,25 @@ def get_exportacao_anos():
                     'paises': {
                         'type': 'array',
                         'items': {'type': 'string'}
+                    },
+                    'detalhes': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'pais': {'type': 'string'},
+                                'registros': {'type': 'integer'},
+                                'anos': {'type': 'integer'},
+                                'ano_inicio': {'type': 'integer'},
+                                'ano_fim': {'type': 'integer'}
+                            }
+                        }
                     }
                 }
             }
+        },
+        304: {
+            'description': 'Catálogo inalterado (If-None-Match)'
         }
     }
 })
@@ -181,9 +256,7 @@ def get_exportacao_paises():
         service = EmbrapaService()
         data = service.get_data('exportacao')
         
-        paises = sorted(list(set(item.get('pais') for item in data if item.get('pais'))))
-        
-        return jsonify({'paises': paises}), 200
+        return catalog_response(data.catalog, 'paises')
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500 
\ No newline at end of file
@@ -79,9 +79,24 @@ def health():
             timestamp:
               type: string
               example: "2024-01-01T00:00:00Z"
+            upstream:
+              type: object
+              description: Circuit breaker de cada dataset (state, failures, last_error, last_failure, retry_in)
+            datasets:
+              type: object
+              description: Snapshots em memória (source, generation, age, records)
+            response_cache:
+              type: object
+              description: Cache de respostas (entries, bytes, hits, misses, hit_rate, evictions)
     """
     from datetime import datetime
+    from app.services.circuit_breaker import get_circuit_breakers_status
+    from app.services.dataset_store import dataset_store
+    from app.services.response_cache import get_response_cache_status
     return jsonify({
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat() + "Z"
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "upstream": get_circuit_breakers_status(),
+        "datasets": dataset_store.stats(),
+        "response_cache": get_response_cache_status()
     }) 
\ No newline at end of file
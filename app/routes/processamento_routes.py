@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 from app.services.embrapa_service import EmbrapaService
-from app.utils.pagination import get_pagination_params, paginate_data, get_filter_params
+from app.utils.pagination import get_pagination_params, paginate_request, get_filter_params, InvalidParameter
+from app.utils.http import catalog_response, cached_response
 from app.utils.auth import optional_token
 from flasgger import swag_from
 
@@ -8,6 +9,7 @@ processamento_bp = Blueprint('processamento', __name__)
 
 @processamento_bp.route('/processamento', methods=['GET'])
 @optional_token
+@cached_response('processamento')
 @swag_from({
     'tags': ['Processamento'],
     'summary': 'Obter dados de processamento',
@@ -25,17 +27,71 @@ processamento_bp = Blueprint('processamento', __name__)
             'type': 'integer',
             'description': 'Itens por página (padrão: 50, máximo: 1000)'
         },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Paginação por cursor: vazio na primeira página, depois o next_cursor da resposta anterior (ignora page)'
+        },
+        {
+            'name': 'count',
+            'in': 'query',
+            'type': 'boolean',
+            'description': 'Com cursor, calcula o total mesmo quando ele exige a interseção de filtros (padrão: false)'
+        },
+        {
+            'name': 'sort',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Ordenação por campos separados por vírgula; prefixo - para decrescente (ex.: -quantidade,ano)'
+        },
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Campos retornados em cada registro, separados por vírgula (ex.: ano,quantidade)'
+        },
+        {
+            'name': 'compact',
+            'in': 'query',
+            'type': 'boolean',
+            'description': 'Envia os campos constantes do dataset (unidade, tipo) uma única vez, em constantes (padrão: false)'
+        },
         {
             'name': 'ano',
             'in': 'query',
+            'type': 'string',
+            'description': 'Filtrar por ano (aceita vários, separados por vírgula)'
+        },
+        {
+            'name': 'ano_inicio',
+            'in': 'query',
             'type': 'integer',
-            'description': 'Filtrar por ano'
+            'description': 'Primeiro ano do intervalo'
+        },
+        {
+            'name': 'ano_fim',
+            'in': 'query',
+            'type': 'integer',
+            'description': 'Último ano do intervalo'
         },
         {
             'name': 'cultivar',
             'in': 'query',
             'type': 'string',
-            'description': 'Filtrar por cultivar'
+            'description': 'Filtrar por cultivar (aceita vários, separados por vírgula)'
+        },
+        {
+            'name': 'categoria',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Filtrar pela categoria do CSV (ex.: TINTAS)'
+        },
+        {
+            'name': 'subtotal',
+            'in': 'query',
+            'type': 'boolean',
+            'description': 'false: só os itens; true: só os subtotais de cada categoria'
         },
         {
             'name': 'Authorization',
@@ -57,11 +113,17 @@ processamento_bp = Blueprint('processamento', __name__)
                             'properties': {
                                 'ano': {'type': 'integer'},
                                 'cultivar': {'type': 'string'},
+                                'categoria': {'type': 'string', 'description': 'Categoria do CSV (linha em maiúsculas)'},
+                                'subtotal': {'type': 'boolean', 'description': 'true quando o valor é a soma dos itens da categoria'},
                                 'quantidade': {'type': 'integer'},
                                 'unidade': {'type': 'string'}
                             }
                         }
                     },
+                    'constantes': {
+                        'type': 'object',
+                        'description': 'Campos constantes do dataset (somente com compact=true)'
+                    },
                     'pagination': {
                         'type': 'object',
                         'properties': {
@@ -70,7 +132,9 @@ processamento_bp = Blueprint('processamento', __name__)
                             'total': {'type': 'integer'},
                             'pages': {'type': 'integer'},
                             'has_prev': {'type': 'boolean'},
-                            'has_next': {'type': 'boolean'}
+                            'has_next': {'type': 'boolean'},
+                            'cursor': {'type': 'string', 'description': 'Somente na paginação por cursor'},
+                            'next_cursor': {'type': 'string', 'description': 'Somente na paginação por cursor'}
                         }
                     }
                 }
@@ -90,16 +154,12 @@ def get_processamento():
         
         data = service.get_data('processamento')
         
-        if filters.get('ano'):
-            data = [item for item in data if item.get('ano') == filters['ano']]
-        
-        if filters.get('cultivar'):
-            data = [item for item in data if filters['cultivar'].lower() in item.get('cultivar', '').lower()]
-        
-        result = paginate_data(data, page, per_page)
+        result = paginate_request(data, filters, page, per_page)
         
         return jsonify(result), 200
         
+    except InvalidParameter as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
 
@@ -126,9 +186,23 @@ def get_processamento():
                     'anos': {
                         'type': 'array',
                         'items': {'type': 'integer'}
+                    },
+                    'detalhes': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'ano': {'type': 'integer'},
+                                'registros': {'type': 'integer'},
+                                'entidades': {'type': 'integer'}
+                            }
+                        }
                     }
                 }
             }
+        },
+        304: {
+            'description': 'Catálogo inalterado (If-None-Match)'
         }
     }
 })
@@ -138,9 +212,7 @@ def get_processamento_anos():
         service = EmbrapaService()
         data = service.get_data('processamento')
         
-        anos = sorted(list(set(item.get('ano') for item in data if item.get('ano'))))
-        
-        return jsonify({'anos': anos}), 200
+        return catalog_response(data.catalog, 'anos')
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500
@@ -168,9 +240,25 @@ def get_processamento_anos():
                     'cultivares': {
                         'type': 'array',
                         'items': {'type': 'string'}
+                    },
+                    'detalhes': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'cultivar': {'type': 'string'},
+                                'registros': {'type': 'integer'},
+                                'anos': {'type': 'integer'},
+                                'ano_inicio': {'type': 'integer'},
+                                'ano_fim': {'type': 'integer'}
+                            }
+                        }
                     }
                 }
             }
+        },
+        304: {
+            'description': 'Catálogo inalterado (If-None-Match)'
         }
     }
 })
@@ -180,9 +268,7 @@ def get_processamento_cultivares():
         service = EmbrapaService()
         data = service.get_data('processamento')
         
-        cultivares = sorted(list(set(item.get('cultivar') for item in data if item.get('cultivar'))))
-        
-        return jsonify({'cultivares': cultivares}), 200
+        return catalog_response(data.catalog, 'cultivares')
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor', 'message': str(e)}), 500 
\ No newline at end of file
@@ -0,0 +1,105 @@
+import threading
+import time
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Circuit breaker (fechado / aberto / meio-aberto) com backoff exponencial
+
+    Depois de `failure_threshold` falhas seguidas o circuito abre e as chamadas são recusadas
+    imediatamente. Passado o tempo de espera, uma única chamada de teste é liberada
+    (meio-aberto): sucesso fecha o circuito; falha o reabre com o dobro da espera, até `max_timeout`.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30, max_timeout=600):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_count = 0
+        self.retry_at = 0
+        self.last_error = None
+        self.last_failure = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Indica se uma chamada ao serviço protegido pode ser feita agora"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        """Registra uma chamada bem-sucedida e fecha o circuito"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuito de {self.name} fechado")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_count = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, error):
+        """Registra uma falha; abre o circuito ao atingir o limite ou se o teste meio-aberto falhar"""
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self.last_failure = datetime.utcnow().isoformat() + "Z"
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                timeout = min(self.reset_timeout * (2 ** self.opened_count), self.max_timeout)
+                self.opened_count += 1
+                self.state = self.OPEN
+                self.retry_at = time.monotonic() + timeout
+                logger.warning(f"Circuito de {self.name} aberto por {timeout}s após {self.failures} falha(s): {error}")
+
+    def status(self):
+        """Estado atual do circuito (usado no /health)"""
+        with self._lock:
+            status = {
+                'state': self.state,
+                'failures': self.failures,
+                'last_error': self.last_error,
+                'last_failure': self.last_failure
+            }
+            if self.state == self.OPEN:
+                status['retry_in'] = round(max(0, self.retry_at - time.monotonic()), 1)
+            return status
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(name, config):
+    """Circuit breaker do processo para um dataset, criado na primeira utilização"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    failure_threshold=config['CIRCUIT_BREAKER_FAILURE_THRESHOLD'],
+                    reset_timeout=config['CIRCUIT_BREAKER_RESET_TIMEOUT'],
+                    max_timeout=config['CIRCUIT_BREAKER_MAX_TIMEOUT']
+                )
+                _breakers[name] = breaker
+    return breaker
+
+def get_circuit_breakers_status():
+    """Estado de todos os circuit breakers já criados"""
+    return {name: breaker.status() for name, breaker in sorted(_breakers.items())}
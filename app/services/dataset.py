@@ -0,0 +1,424 @@
+import csv
+import hashlib
+import logging
+from array import array
+from collections.abc import Sequence
+from app.services.dataset_catalog import DatasetCatalog
+from app.services.dataset_index import DatasetIndex
+from app.services.dataset_ranking import DatasetRanking
+from app.services.dataset_rollup import DatasetRollups
+from app.services.dataset_series import DatasetSeries
+from app.services.dataset_sort import DatasetSorter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Valores de célula que não geram registro
+MISSING_VALUES = frozenset(['', '0', 'nd', '*'])
+
+def find_year_columns(header):
+    """Posições das colunas de ano no cabeçalho do CSV: {ano: [posições]}"""
+    years = {}
+    for position, name in enumerate(header):
+        name = name.strip()
+        if len(name) == 4 and name.isdigit():
+            years.setdefault(int(name), []).append(position)
+    return years
+
+def parse_number(value):
+    """Converte o texto de uma célula em inteiro; None quando a célula não tem dado"""
+    value = value.strip()
+    if value in MISSING_VALUES:
+        return None
+    try:
+        return int(float(value.replace(',', '.')))
+    except (ValueError, OverflowError):
+        return None
+
+def classify_rows(names, controls=None):
+    """Categoria de cada linha de um CSV com categorias e a marca das linhas de subtotal
+
+    A linha de uma categoria tem o controle (ou, sem a coluna de controle, o nome) em maiúsculas
+    e os itens seguintes pertencem a ela. Uma categoria seguida de itens é o subtotal deles; sem
+    itens, ela é o próprio item (ex.: "VINHO FRIZANTE" na comercialização).
+    """
+    controls = controls or names
+    headers = [(control or name).isupper() for control, name in zip(controls, names)]
+    categories = []
+    subtotals = bytearray(len(names))
+    category = None
+    for row, name in enumerate(names):
+        if headers[row]:
+            category = name
+            subtotals[row] = row + 1 < len(names) and not headers[row + 1]
+        categories.append(category)
+    return categories, subtotals
+
+class Dataset(Sequence):
+    """Dataset da Embrapa em formato colunar: matriz entidade x ano
+
+    Cada linha do CSV é uma linha da matriz (`names`), cada ano uma coluna (`years`) e as
+    métricas (`columns`) são arrays numéricos densos, em ordem linha-major. Os registros
+    (dicts) só são montados quando acessados; `cells` guarda, na ordem original, as
+    posições da matriz que têm dado.
+
+    Nos datasets com categorias (`category_field` no esquema) cada linha tem ainda a sua
+    categoria (`categories`) e a marca das linhas de categoria seguidas de itens (`subtotals`).
+    Os valores dessas linhas são a soma dos itens abaixo delas e ficam fora de agregados, séries
+    e rankings (ver `subtotal_cells`).
+    """
+
+    def __init__(self, endpoint, schema, names, years, columns, cells, categories=None, subtotals=None):
+        self.endpoint = endpoint
+        self.schema = schema
+        self.entity_field = schema['entity_field']
+        self.category_field = schema.get('category_field')
+        self.constants = schema.get('constants', {})
+        self.names = names
+        self.years = years
+        self.columns = columns
+        self.cells = cells
+        if categories is None:
+            if self.category_field:
+                categories, subtotals = classify_rows(names)
+            else:
+                categories, subtotals = [None] * len(names), bytearray(len(names))
+        self.categories = categories
+        self.subtotals = subtotals
+        self._subtotal_cells = None
+        self._version = None
+        self._index = None
+        self._rollups = None
+        self._catalog = None
+        self._sorter = None
+        self._series = None
+        self._ranking = None
+        self._encoded = None
+
+    @classmethod
+    def from_csv(cls, endpoint, schema, lines):
+        """Monta o dataset a partir das linhas de um CSV da Embrapa, localizando as colunas de ano uma única vez"""
+        reader = csv.reader(lines, delimiter=schema['delimiter'])
+        header = next(reader, [])
+
+        stripped = [name.strip() for name in header]
+        if schema['entity_column'] not in stripped:
+            return cls.from_records(endpoint, schema, [])
+        entity_position = stripped.index(schema['entity_column'])
+        category_column = schema.get('category_column')
+        category_position = stripped.index(category_column) if category_column in stripped else None
+
+        # Datasets com mais de uma métrica repetem cada ano (ex.: quantidade e valor), na ordem de
+        # `metrics`; com uma única métrica fica a última coluna do ano, como no csv.DictReader
+        metrics = schema.get('metrics', ('quantidade',))
+        year_columns = find_year_columns(header)
+        years = sorted(year_columns)
+        if len(metrics) == 1:
+            layout = [(year_columns[year][-1],) for year in years]
+        else:
+            layout = [
+                tuple(year_columns[year][k] if k < len(year_columns[year]) else None for k in range(len(metrics)))
+                for year in years
+            ]
+
+        ignore = schema.get('ignore', ())
+        names = []
+        controls = []
+        columns = [array('q') for _ in metrics]
+        cells = array('I')
+        width = len(years)
+        last_position = max((p for positions in layout for p in positions if p is not None), default=-1)
+
+        for row in reader:
+            if entity_position >= len(row):
+                continue
+            name = row[entity_position].strip()
+            if not name or name.upper() in ignore:
+                continue
+
+            if len(row) <= last_position:
+                row.extend([''] * (last_position + 1 - len(row)))
+
+            base = len(names) * width
+            names.append(name)
+            if category_position is not None and category_position < len(row):
+                controls.append(row[category_position].strip())
+            if len(columns) == 1:
+                # Caminho rápido para datasets de uma única métrica
+                column = columns[0]
+                for offset, (position,) in enumerate(layout):
+                    text = row[position].strip()
+                    if text in MISSING_VALUES:
+                        column.append(0)
+                        continue
+                    try:
+                        value = int(text)
+                    except ValueError:
+                        value = parse_number(text)
+                        if value is None:
+                            column.append(0)
+                            continue
+                    column.append(value)
+                    cells.append(base + offset)
+                continue
+
+            for offset, positions in enumerate(layout):
+                present = False
+                for column, position in zip(columns, positions):
+                    text = row[position].strip() if position is not None else ''
+                    if text in MISSING_VALUES:
+                        column.append(0)
+                        continue
+                    try:
+                        value = int(text)
+                    except ValueError:
+                        value = parse_number(text)
+                        if value is None:
+                            column.append(0)
+                            continue
+                    column.append(value)
+                    present = True
+                if present:
+                    cells.append(base + offset)
+
+        categories = subtotals = None
+        if schema.get('category_field'):
+            categories, subtotals = classify_rows(names, controls if len(controls) == len(names) else None)
+        return cls(endpoint, schema, names, years, dict(zip(metrics, columns)), cells, categories, subtotals)
+
+    @classmethod
+    def from_records(cls, endpoint, schema, records, metrics=None):
+        """Monta o dataset a partir de registros já processados (cache JSON, dados mock)
+
+        `metrics` restringe as colunas às métricas que os registros realmente trazem; as demais
+        métricas do esquema ficam fora dos registros, em vez de aparecerem como zero. Sem a
+        categoria nos registros (cache JSON antigo), ela é deduzida dos nomes em maiúsculas.
+        """
+        entity_field = schema['entity_field']
+        category_field = schema.get('category_field')
+        years = sorted(set(record['ano'] for record in records))
+        year_offsets = {year: offset for offset, year in enumerate(years)}
+        width = len(years)
+
+        # Uma nova linha da matriz começa quando a entidade muda ou um ano se repete
+        rows = []
+        for record in records:
+            name = record.get(entity_field, '')
+            if not rows or rows[-1][0] != name or record['ano'] in rows[-1][1]:
+                rows.append((name, {}))
+            rows[-1][1][record['ano']] = record
+
+        metrics = metrics or schema.get('metrics', ('quantidade',))
+        names = []
+        columns = {metric: array('q', bytes(8 * width * len(rows))) for metric in metrics}
+        cells = array('I')
+        for row_id, (name, by_year) in enumerate(rows):
+            names.append(name)
+            for year, record in by_year.items():
+                cell = row_id * width + year_offsets[year]
+                for metric, values in columns.items():
+                    values[cell] = record.get(metric) or 0
+                cells.append(cell)
+
+        categories = subtotals = None
+        if category_field and records and category_field in records[0]:
+            categories = [next(iter(by_year.values())).get(category_field) for _, by_year in rows]
+            subtotals = bytearray(any(record.get('subtotal') for record in by_year.values()) for _, by_year in rows)
+        return cls(endpoint, schema, names, years, columns, cells, categories, subtotals)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.record(i) for i in range(*index.indices(len(self.cells)))]
+        if index < 0:
+            index += len(self.cells)
+        return self.record(index)
+
+    def __iter__(self):
+        for index in range(len(self.cells)):
+            yield self.record(index)
+
+    def record(self, index):
+        """Monta o registro (dict) de uma posição do dataset"""
+        cell = self.cells[index]
+        row_id, offset = divmod(cell, len(self.years))
+        record = {'ano': self.years[offset], self.entity_field: self.names[row_id]}
+        if self.category_field:
+            record[self.category_field] = self.categories[row_id]
+            record['subtotal'] = bool(self.subtotal_cells[cell])
+        for metric, values in self.columns.items():
+            record[metric] = values[cell]
+        record.update(self.constants)
+        return record
+
+    @property
+    def fields(self):
+        """Campos dos registros, na ordem em que são montados"""
+        categories = (self.category_field, 'subtotal') if self.category_field else ()
+        return ('ano', self.entity_field) + categories + tuple(self.columns) + tuple(self.constants)
+
+    def projection(self, fields=None, constants=True):
+        """Função que monta registros apenas com os campos pedidos
+
+        Com `constants=False` os campos constantes do dataset (unidade, tipo) ficam de fora, para
+        serem enviados uma única vez no envelope da resposta.
+        """
+        if not fields and constants:
+            return self.record
+
+        wanted = set(fields or self.fields)
+        with_year = 'ano' in wanted
+        with_entity = self.entity_field in wanted
+        category_field = self.category_field
+        with_category = category_field is not None and category_field in wanted
+        with_subtotal = category_field is not None and 'subtotal' in wanted
+        subtotal_cells = self.subtotal_cells if with_subtotal else None
+        metrics = [(metric, values) for metric, values in self.columns.items() if metric in wanted]
+        fixed = {key: value for key, value in self.constants.items() if key in wanted} if constants else {}
+        entity_field = self.entity_field
+        width = len(self.years)
+
+        def record(index):
+            cell = self.cells[index]
+            record = {}
+            if with_year or with_entity or with_category or with_subtotal:
+                row_id, offset = divmod(cell, width)
+                if with_year:
+                    record['ano'] = self.years[offset]
+                if with_entity:
+                    record[entity_field] = self.names[row_id]
+                if with_category:
+                    record[category_field] = self.categories[row_id]
+                if with_subtotal:
+                    record['subtotal'] = bool(subtotal_cells[cell])
+            for metric, values in metrics:
+                record[metric] = values[cell]
+            if fixed:
+                record.update(fixed)
+            return record
+
+        return record
+
+    @property
+    def subtotal_cells(self):
+        """Marca, por célula da matriz, os valores que são o subtotal de uma categoria
+
+        A linha de uma categoria só é subtotal nos anos em que algum item dela tem dado; nos
+        demais (ex.: espumantes na comercialização até 1996, sem detalhamento por item) o valor
+        dela é o único da categoria e conta como item.
+        """
+        if self._subtotal_cells is None:
+            width = len(self.years)
+            present = bytearray(len(self.names) * width)
+            for cell in self.cells:
+                present[cell] = 1
+
+            detailed = {}
+            for row, category in enumerate(self.categories):
+                if category is not None and not self.subtotals[row]:
+                    years = detailed.setdefault(category, bytearray(width))
+                    base = row * width
+                    for offset in range(width):
+                        if present[base + offset]:
+                            years[offset] = 1
+
+            marks = bytearray(len(self.names) * width)
+            for row, category in enumerate(self.categories):
+                if self.subtotals[row] and category in detailed:
+                    marks[row * width:(row + 1) * width] = detailed[category]
+            self._subtotal_cells = marks
+        return self._subtotal_cells
+
+    @property
+    def version(self):
+        """Hash do conteúdo do dataset; muda sempre que algum dado muda"""
+        if self._version is None:
+            digest = hashlib.sha256()
+            digest.update('\0'.join(self.names).encode('utf-8'))
+            digest.update(array('i', self.years).tobytes())
+            digest.update(self.cells)
+            if self.category_field:
+                digest.update('\0'.join(category or '' for category in self.categories).encode('utf-8'))
+                digest.update(self.subtotals)
+            for metric, values in self.columns.items():
+                digest.update(metric.encode('utf-8'))
+                digest.update(values)
+            self._version = digest.hexdigest()[:16]
+        return self._version
+
+    @property
+    def index(self):
+        """Índices secundários (ano, entidade), construídos no primeiro uso e válidos enquanto o dataset existir"""
+        if self._index is None:
+            self._index = DatasetIndex(self)
+        return self._index
+
+    @property
+    def rollups(self):
+        """Agregados pré-calculados por ano, década e entidade"""
+        if self._rollups is None:
+            self._rollups = DatasetRollups(self)
+        return self._rollups
+
+    @property
+    def catalog(self):
+        """Catálogos de anos e entidades com contagens e cobertura"""
+        if self._catalog is None:
+            self._catalog = DatasetCatalog(self)
+        return self._catalog
+
+    @property
+    def sorter(self):
+        """Permutações de ordenação (parâmetro sort)"""
+        if self._sorter is None:
+            self._sorter = DatasetSorter(self)
+        return self._sorter
+
+    @property
+    def series(self):
+        """Séries anuais por entidade (crescimento, média móvel e CAGR)"""
+        if self._series is None:
+            self._series = DatasetSeries(self)
+        return self._series
+
+    @property
+    def ranking(self):
+        """Rankings (top N) de entidades por ano e métrica"""
+        if self._ranking is None:
+            self._ranking = DatasetRanking(self)
+        return self._ranking
+
+    def prepare(self):
+        """Constrói índices, rollups, catálogos, ordenações e séries antes de o dataset ser publicado, fora do caminho das requisições"""
+        self.index
+        mismatches = self.rollups.check_subtotals()
+        if mismatches:
+            category, year, metric, total, items = max(mismatches, key=lambda mismatch: abs(mismatch[3] - mismatch[4]))
+            logger.warning(
+                f"{self.endpoint}: {len(mismatches)} subtotais do CSV diferem da soma dos itens; maior diferença: "
+                f"{category} em {year} ({metric}), subtotal {total} e itens {items}"
+            )
+        self.catalog
+        self.sorter.warm()
+        self.series.warm()
+        return self
+
+    def encoded_records(self):
+        """JSON (bytes) de cada registro completo, por posição; preenchido sob demanda pelo provider JSON"""
+        if self._encoded is None:
+            self._encoded = [None] * len(self.cells)
+        return self._encoded
+
+    def matrix(self, metric='quantidade'):
+        """Matriz entidade x ano de uma métrica (ndarray quando o NumPy está disponível)"""
+        values = self.columns[metric]
+        width = len(self.years)
+        if np is not None:
+            return np.frombuffer(values, dtype=np.int64).reshape(len(self.names), width)
+        return [values[row_id * width:(row_id + 1) * width] for row_id in range(len(self.names))]
@@ -0,0 +1,54 @@
+class DatasetCatalog:
+    """Catálogos de valores distintos (anos e entidades) de uma versão do dataset
+
+    Cada valor traz a quantidade de registros e a cobertura de anos. O JSON de cada catálogo é
+    gerado uma única vez e servido com um ETag forte derivado da versão do dataset.
+    """
+
+    def __init__(self, dataset):
+        index = dataset.index
+        self.endpoint = dataset.endpoint
+        self.version = dataset.version
+        self.entity_field = dataset.entity_field
+
+        self.years = [
+            {
+                'ano': year,
+                'registros': len(index.by_year[year]),
+                'entidades': len({index.row_entity[row] for row in index.by_year[year]})
+            }
+            for year in index.years
+        ]
+
+        self.entities = []
+        for entity_id, name in enumerate(index.entities):
+            rows = index.by_entity.get(entity_id)
+            if not name or not rows:
+                continue
+            years = {index.row_year[row] for row in rows}
+            self.entities.append({
+                self.entity_field: name,
+                'registros': len(rows),
+                'anos': len(years),
+                'ano_inicio': min(years),
+                'ano_fim': max(years)
+            })
+        self.entities.sort(key=lambda item: item[self.entity_field])
+
+        self._encoded = {}
+
+    def payload(self, key):
+        """Corpo do catálogo: `anos` para os anos; qualquer outra chave (produtos, paises...) para as entidades"""
+        if key == 'anos':
+            return {'anos': [item['ano'] for item in self.years], 'detalhes': self.years}
+        return {key: [item[self.entity_field] for item in self.entities], 'detalhes': self.entities}
+
+    def etag(self, key):
+        return f'{self.version}-{key}'
+
+    def encoded(self, key, dumps):
+        """JSON do catálogo, serializado na primeira requisição e reaproveitado nas seguintes"""
+        body = self._encoded.get(key)
+        if body is None:
+            body = self._encoded[key] = dumps(self.payload(key)).encode('utf-8')
+        return body
@@ -0,0 +1,252 @@
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from itertools import islice
+
+def trigrams(text):
+    """Conjunto de trigramas (substrings de 3 caracteres) de um texto"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def match_terms(value, match):
+    """Aplica `match` a um filtro que aceita vários valores separados por vírgula
+
+    O valor é primeiro buscado por inteiro, porque alguns nomes têm vírgula
+    (ex.: "Tcheca, República"); se nada for encontrado, cada parte é buscada separadamente.
+    """
+    matched = match(value)
+    if matched or ',' not in value:
+        return matched
+    for part in value.split(','):
+        part = part.strip()
+        if part:
+            matched |= match(part)
+    return matched
+
+class DatasetView(Sequence):
+    """Subconjunto de um dataset definido por posições; registros só são montados quando lidos
+
+    Um recorte (ex.: a página pedida) é outra visão, que o provider JSON serializa a partir dos
+    registros pré-codificados do dataset.
+    """
+
+    def __init__(self, dataset, rows, record=None):
+        self.dataset = dataset
+        self.rows = rows
+        # Função que monta o registro de uma posição (ex.: com projeção de campos)
+        self.record = record or dataset.record
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return DatasetView(self.dataset, self.rows[index], self.record)
+        return self.record(self.rows[index])
+
+    def __iter__(self):
+        for row in self.rows:
+            yield self.record(row)
+
+class DatasetIndex:
+    """Índices de um dataset (ano -> posições, entidade -> posições), construídos uma vez por versão
+
+    As posições são os índices dos registros no dataset, sempre em ordem crescente.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        width = len(dataset.years)
+
+        # Entidades distintas (uma mesma entidade pode aparecer em mais de uma linha do CSV)
+        self.entity_ids = {}
+        row_entity_of_matrix = []
+        for name in dataset.names:
+            row_entity_of_matrix.append(self.entity_ids.setdefault(name, len(self.entity_ids)))
+        self.entities = list(self.entity_ids)
+        self.lower_entities = [name.lower() for name in self.entities]
+
+        # Índice de trigramas dos nomes (já em minúsculas): trigrama -> ids das entidades
+        self.trigrams = {}
+        for entity_id, name in enumerate(self.lower_entities):
+            for gram in trigrams(name):
+                self.trigrams.setdefault(gram, set()).add(entity_id)
+
+        # Categorias distintas (None nos datasets sem categoria) e a marca de subtotal de cada posição
+        self.category_ids = {}
+        category_of_matrix = [self.category_ids.setdefault(category, len(self.category_ids)) for category in dataset.categories]
+        self.categories = list(self.category_ids)
+
+        subtotal_cells = dataset.subtotal_cells
+        self.row_year = array('i')
+        self.row_entity = array('I')
+        self.row_category = array('I')
+        self.row_subtotal = bytearray()
+        self.by_year = {}
+        self.by_entity = {}
+        for position, cell in enumerate(dataset.cells):
+            matrix_row, offset = divmod(cell, width)
+            year = dataset.years[offset]
+            entity_id = row_entity_of_matrix[matrix_row]
+            self.row_year.append(year)
+            self.row_entity.append(entity_id)
+            self.row_category.append(category_of_matrix[matrix_row])
+            self.row_subtotal.append(subtotal_cells[cell])
+            self.by_year.setdefault(year, array('I')).append(position)
+            self.by_entity.setdefault(entity_id, array('I')).append(position)
+        self.years = sorted(self.by_year)
+
+    def match_entities(self, text):
+        """Ids das entidades cujo nome contém o texto (sem diferenciar maiúsculas)
+
+        Textos com 3 ou mais caracteres são resolvidos pela interseção das listas de trigramas,
+        e só os candidatos restantes são conferidos; textos menores percorrem os nomes distintos.
+        """
+        text = text.lower()
+        grams = trigrams(text)
+        if not grams:
+            return {entity_id for entity_id, name in enumerate(self.lower_entities) if text in name}
+
+        postings = []
+        for gram in grams:
+            entity_ids = self.trigrams.get(gram)
+            if not entity_ids:
+                return set()
+            postings.append(entity_ids)
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for entity_ids in postings[1:]:
+            candidates &= entity_ids
+            if not candidates:
+                return candidates
+        if len(grams) == 1:
+            return candidates
+        return {entity_id for entity_id in candidates if text in self.lower_entities[entity_id]}
+
+    def search(self, text, limit=10):
+        """Entidades cujo nome contém o texto, para autocomplete: [(nome, registros)]
+
+        Nomes que começam com o texto vêm primeiro, depois os que têm uma palavra começando
+        com ele; em cada grupo, as entidades com mais registros.
+        """
+        lowered = text.lower()
+
+        def rank(entity_id):
+            name = self.lower_entities[entity_id]
+            if name.startswith(lowered):
+                group = 0
+            elif f' {lowered}' in name:
+                group = 1
+            else:
+                group = 2
+            return (group, -len(self.by_entity.get(entity_id, ())), name)
+
+        matches = sorted(self.match_entities(text), key=rank)[:limit]
+        return [(self.entities[entity_id], len(self.by_entity.get(entity_id, ()))) for entity_id in matches]
+
+    def match_filter(self, value):
+        """Ids das entidades de um filtro por nome, que aceita vários valores separados por vírgula"""
+        return match_terms(value, self.match_entities)
+
+    def match_categories(self, value):
+        """Ids das categorias cujo nome contém o texto do filtro (mesma regra de vírgulas dos nomes)"""
+        def match(text):
+            text = text.lower()
+            return {
+                category_id for category_id, category in enumerate(self.categories)
+                if category is not None and text in category.lower()
+            }
+
+        return match_terms(value, match)
+
+    def select_years(self, anos=None, ano_inicio=None, ano_fim=None):
+        """Anos do dataset que atendem aos filtros de ano (None quando não há filtro)
+
+        O intervalo é resolvido com bisect sobre a lista ordenada de anos.
+        """
+        if anos is None and ano_inicio is None and ano_fim is None:
+            return None
+        start = bisect_left(self.years, ano_inicio) if ano_inicio is not None else 0
+        end = bisect_right(self.years, ano_fim) if ano_fim is not None else len(self.years)
+        years = self.years[start:end]
+        if anos is not None:
+            wanted = set(anos)
+            years = [year for year in years if year in wanted]
+        return years
+
+    def plan(self, anos=None, ano_inicio=None, ano_fim=None, entidade=None):
+        """Plano de execução dos filtros: (listas candidatas, filtro residual, total); None sem filtros
+
+        As listas candidatas (ordenadas) são as do lado mais seletivo, e o filtro residual confere
+        o outro lado em O(1) por registro. O total só é conhecido pela cardinalidade dos índices
+        quando há filtro em uma única dimensão; com as duas ele vem como None.
+        """
+        years = self.select_years(anos, ano_inicio, ano_fim)
+        entity_ids = self.match_filter(entidade) if entidade else None
+        if years is None and entity_ids is None:
+            return None
+
+        year_lists = [self.by_year[year] for year in years] if years is not None else None
+        entity_lists = (
+            [self.by_entity[entity_id] for entity_id in entity_ids if entity_id in self.by_entity]
+            if entity_ids is not None else None
+        )
+        if entity_lists is None:
+            return year_lists, None, sum(len(rows) for rows in year_lists)
+        if year_lists is None:
+            return entity_lists, None, sum(len(rows) for rows in entity_lists)
+
+        if sum(len(rows) for rows in year_lists) <= sum(len(rows) for rows in entity_lists):
+            return year_lists, lambda row: self.row_entity[row] in entity_ids, None
+        wanted = set(years)
+        return entity_lists, lambda row: self.row_year[row] in wanted, None
+
+    def select(self, anos=None, ano_inicio=None, ano_fim=None, entidade=None):
+        """Posições dos registros que atendem aos filtros (None quando não há filtro)
+
+        O custo acompanha o tamanho do resultado (e do lado mais seletivo), não o do dataset.
+        """
+        plan = self.plan(anos, ano_inicio, ano_fim, entidade)
+        if plan is None:
+            return None
+        lists, check, _ = plan
+        if len(lists) == 1:
+            rows = lists[0]
+        else:
+            rows = array('I')
+            for candidates in lists:
+                rows.extend(candidates)
+            rows = array('I', sorted(rows))
+        if check is None:
+            return rows
+        return array('I', (row for row in rows if check(row)))
+
+    def iter_select(self, anos=None, ano_inicio=None, ano_fim=None, entidade=None, start=0):
+        """Gera, sob demanda e em ordem, as posições a partir de `start` que atendem aos filtros
+
+        Cada lista candidata é posicionada com bisect e as listas são intercaladas com heapq.merge,
+        de modo que quem consome só paga pelos registros que efetivamente lê.
+        """
+        plan = self.plan(anos, ano_inicio, ano_fim, entidade)
+        if plan is None:
+            yield from range(start, len(self.row_year))
+            return
+        lists, check, _ = plan
+        streams = [islice(rows, bisect_left(rows, start), None) for rows in lists]
+        rows = streams[0] if len(streams) == 1 else heapq.merge(*streams)
+        for row in rows:
+            if check is None or check(row):
+                yield row
+
+    def count(self, anos=None, ano_inicio=None, ano_fim=None, entidade=None, exact=False):
+        """Total de registros dos filtros pela cardinalidade dos índices
+
+        Com filtros em duas dimensões o total exige a interseção: só é calculado com `exact`.
+        """
+        plan = self.plan(anos, ano_inicio, ano_fim, entidade)
+        if plan is None:
+            return len(self.row_year)
+        if plan[2] is not None or not exact:
+            return plan[2]
+        return len(self.select(anos, ano_inicio, ano_fim, entidade))
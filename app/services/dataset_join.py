@@ -0,0 +1,209 @@
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from app.services.dataset_index import match_terms
+
+# Cruzamentos entre datasets: chave ([categoria,] entidade, ano) e métricas de cada lado
+JOINS = {
+    'producao-comercializacao': {
+        'left': 'producao',
+        'right': 'comercializacao',
+        'key_field': 'produto',
+        # Itens são cruzados dentro da categoria ("Tinto" de vinho de mesa não é o "Tinto" de vinho fino)
+        'category_field': 'categoria',
+        # Categorias com grafias diferentes nos dois CSVs (a do lado esquerdo é a exibida)
+        'category_aliases': {'VINHO  FINO DE MESA': 'VINHO FINO DE MESA (VINIFERA)'},
+        'metrics': {
+            'producao': ('producao', 'quantidade'),
+            'comercializacao': ('comercializacao', 'quantidade')
+        },
+        # diferenca = producao - comercializacao
+        'differences': {'diferenca': ('producao', 'comercializacao')},
+        'constants': {'unidade': 'litros'}
+    },
+    'balanca-comercial': {
+        'left': 'exportacao',
+        'right': 'importacao',
+        'key_field': 'pais',
+        'metrics': {
+            'exportacao_quantidade': ('exportacao', 'quantidade'),
+            'exportacao_valor': ('exportacao', 'valor'),
+            'importacao_quantidade': ('importacao', 'quantidade'),
+            'importacao_valor': ('importacao', 'valor')
+        },
+        'differences': {
+            'saldo_quantidade': ('exportacao_quantidade', 'importacao_quantidade'),
+            'saldo_valor': ('exportacao_valor', 'importacao_valor')
+        },
+        'constants': {'unidade_quantidade': 'kg', 'unidade_valor': 'US$'}
+    }
+}
+
+def normalize_name(name):
+    """Chave de junção de um nome: sem acentos, sem diferença de maiúsculas e de espaços"""
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    return ' '.join(name.casefold().split())
+
+def display_names(names, *datasets):
+    """Nome exibido para cada nome normalizado; vale a grafia do primeiro dataset que o contém
+
+    `names` extrai os nomes de um dataset (ex.: as entidades ou as categorias do índice).
+    """
+    displayed = {}
+    for dataset in reversed(datasets):
+        for name in names(dataset):
+            if name is not None:
+                displayed[normalize_name(name)] = name
+    return displayed
+
+def scan_side(spec, dataset, metrics):
+    """Percorre os registros de um lado do cruzamento: (chave, valores das métricas)
+
+    A chave é (categoria normalizada, nome normalizado, ano), com a categoria vazia nos cruzamentos
+    sem categorias. Os subtotais de categoria ficam de fora, para não somar os itens duas vezes.
+    """
+    index = dataset.index
+    names = [normalize_name(name) for name in index.entities]
+    if spec.get('category_field'):
+        aliases = {normalize_name(alias): normalize_name(name) for alias, name in spec.get('category_aliases', {}).items()}
+        categories = [normalize_name(category or '') for category in index.categories]
+        categories = [aliases.get(category, category) for category in categories]
+    else:
+        categories = [''] * len(index.categories)
+    columns = [dataset.columns[metric] for metric in metrics]
+    for row, cell in enumerate(dataset.cells):
+        if index.row_subtotal[row]:
+            continue
+        key = (categories[index.row_category[row]], names[index.row_entity[row]], index.row_year[row])
+        yield key, [values[cell] for values in columns]
+
+def hash_side(spec, dataset, metrics):
+    """Tabela hash chave -> somas das métricas (linhas repetidas do CSV com a mesma chave são somadas)"""
+    table = {}
+    for key, values in scan_side(spec, dataset, metrics):
+        sums = table.get(key)
+        if sums is None:
+            table[key] = values
+        else:
+            for i, value in enumerate(values):
+                sums[i] += value
+    return table
+
+class JoinResult:
+    """Resultado de um cruzamento, ordenado por ([categoria,] entidade, ano), com índices para os filtros"""
+
+    def __init__(self, key_field, rows, category_field=None):
+        self.key_field = key_field
+        self.category_field = category_field
+        self.rows = rows
+        # Registros de cada (categoria, entidade) ficam contíguos: (categoria, entidade) -> (início, fim)
+        self.ranges = {}
+        for position, row in enumerate(rows):
+            group = (row.get(category_field), row[key_field])
+            start, _ = self.ranges.get(group, (position, position))
+            self.ranges[group] = (start, position + 1)
+        self.lower_names = {group: normalize_name(group[1]) for group in self.ranges}
+        self.lower_categories = {group: normalize_name(group[0] or '') for group in self.ranges}
+        self.row_years = [row['ano'] for row in rows]
+
+    def match(self, lowered, value):
+        """Grupos cujo nome normalizado (`lowered`) contém o texto do filtro (mesma regra de vírgulas das listagens)"""
+        def match(text):
+            text = normalize_name(text)
+            return {group for group, name in lowered.items() if text in name}
+
+        return match_terms(value, match)
+
+    def select(self, anos=None, ano_inicio=None, ano_fim=None, entidade=None, categoria=None):
+        """Registros que atendem aos filtros (mesma semântica dos filtros das listagens)
+
+        Dentro de cada entidade os anos estão em ordem, então o intervalo sai por bisect.
+        """
+        groups = set(self.ranges)
+        if entidade:
+            groups &= self.match(self.lower_names, entidade)
+        if categoria and self.category_field:
+            groups &= self.match(self.lower_categories, categoria)
+
+        wanted = set(anos) if anos else None
+        selected = []
+        for start, end in sorted(self.ranges[group] for group in groups):
+            if ano_inicio is not None:
+                start = bisect_left(self.row_years, ano_inicio, start, end)
+            if ano_fim is not None:
+                end = bisect_right(self.row_years, ano_fim, start, end)
+            for position in range(start, end):
+                if wanted is None or self.row_years[position] in wanted:
+                    selected.append(self.rows[position])
+        return selected
+
+def hash_join(spec, left, right):
+    """Junção externa completa (hash join) dos dois datasets pela chave ([categoria,] entidade, ano)
+
+    Só o lado menor (em registros) vira tabela hash; os registros do maior são percorridos uma única
+    vez e acumulados direto nas linhas do resultado. Uma chave ausente de um lado equivale a zero,
+    como as células vazias dos CSVs da Embrapa; uma métrica que o dataset não tem sai como null.
+    """
+    datasets = {spec['left']: left, spec['right']: right}
+    # Métricas que o dataset não tem (ex.: cache migrado sem quantidade) ficam fora das somas
+    available = [output for output, (source, metric) in spec['metrics'].items() if metric in datasets[source].columns]
+    left_outputs = [output for output in available if spec['metrics'][output][0] == spec['left']]
+    right_outputs = [output for output in available if spec['metrics'][output][0] == spec['right']]
+
+    swapped = len(left.cells) > len(right.cells)
+    build, probe = (right, left) if swapped else (left, right)
+    build_outputs, probe_outputs = (right_outputs, left_outputs) if swapped else (left_outputs, right_outputs)
+    table = hash_side(spec, build, [spec['metrics'][output][1] for output in build_outputs])
+
+    pairs = {}
+    for key, values in scan_side(spec, probe, [spec['metrics'][output][1] for output in probe_outputs]):
+        pair = pairs.get(key)
+        if pair is None:
+            pairs[key] = (table.get(key), values)
+        else:
+            sums = pair[1]
+            for i, value in enumerate(values):
+                sums[i] += value
+    for key, build_entry in table.items():
+        if key not in pairs:
+            pairs[key] = (build_entry, None)
+
+    category_field = spec.get('category_field')
+    names = display_names(lambda dataset: dataset.index.entities, left, right)
+    categories = display_names(lambda dataset: dataset.index.categories, left, right)
+    rows = []
+    for key in sorted(pairs):
+        build_entry, probe_entry = pairs[key]
+        category, name, year = key
+        row = {spec['key_field']: names[name]}
+        if category_field:
+            row[category_field] = categories.get(category)
+        row['ano'] = year
+        values = dict(zip(build_outputs, build_entry or [0] * len(build_outputs)))
+        values.update(zip(probe_outputs, probe_entry or [0] * len(probe_outputs)))
+        for output in spec['metrics']:
+            row[output] = values.get(output)
+        for output, (minuend, subtrahend) in spec['differences'].items():
+            if row[minuend] is None or row[subtrahend] is None:
+                row[output] = None
+            else:
+                row[output] = row[minuend] - row[subtrahend]
+        rows.append(row)
+    return JoinResult(spec['key_field'], rows, category_field)
+
+_results = {}
+_results_lock = threading.Lock()
+
+def get_join(name, left, right):
+    """Resultado do cruzamento para o par de versões atual dos datasets, calculado uma vez por par"""
+    spec = JOINS[name]
+    versions = (left.version, right.version)
+    cached = _results.get(name)
+    if cached is not None and cached[0] == versions:
+        return cached[1]
+
+    result = hash_join(spec, left, right)
+    with _results_lock:
+        _results[name] = (versions, result)
+    return result
@@ -0,0 +1,169 @@
+import threading
+from array import array
+
+# Parâmetros de paginação, ordenação e projeção aceitos junto com os filtros
+QUERY_OPTIONS = frozenset(['page', 'per_page', 'cursor', 'count', 'sort', 'fields', 'compact'])
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'sim': True, 'false': False, '0': False, 'nao': False, 'não': False}
+
+def parse_bool(value):
+    """Converte true/false (1/0, sim/não) em booleano; ValueError para outros valores"""
+    try:
+        return BOOLEAN_VALUES[value.strip().lower()]
+    except KeyError:
+        raise ValueError(f'Valor booleano inválido: {value}')
+
+class DatasetSpec:
+    """Descrição de um dataset derivada do seu esquema em ENDPOINT_MAPPING: campos e filtros aceitos
+
+    Filtros por índice: `ano` (lista), `ano_inicio`, `ano_fim` e o campo de entidade (texto).
+    Cada métrica ganha ainda `<métrica>_min` e `<métrica>_max` e, nos datasets com categorias,
+    há `categoria` (texto) e `subtotal` (booleano); esses são avaliados sobre as posições que
+    sobram depois dos índices.
+    """
+
+    def __init__(self, name, schema):
+        self.name = name
+        self.entity_field = schema['entity_field']
+        self.category_field = schema.get('category_field')
+        self.metrics = tuple(schema.get('metrics', ('quantidade',)))
+        self.constants = dict(schema.get('constants', {}))
+
+        self.filters = {'ano': 'int_list', 'ano_inicio': 'int', 'ano_fim': 'int', self.entity_field: 'text'}
+        if self.category_field:
+            self.filters[self.category_field] = 'text'
+            self.filters['subtotal'] = 'bool'
+        for metric in self.metrics:
+            self.filters[f'{metric}_min'] = 'int'
+            self.filters[f'{metric}_max'] = 'int'
+
+    def parse(self, args):
+        """Converte os parâmetros da requisição em filtros; ValueError para filtros ou valores inválidos"""
+        unknown = [name for name in args if name not in self.filters and name not in QUERY_OPTIONS]
+        if unknown:
+            raise ValueError(f'Filtro inválido: {", ".join(unknown)}; use: {", ".join(self.filters)}')
+
+        params = {}
+        for name, kind in self.filters.items():
+            value = args.get(name, '').strip()
+            if not value:
+                continue
+            try:
+                if kind == 'int_list':
+                    params[name] = [int(part) for part in value.split(',') if part.strip()]
+                elif kind == 'int':
+                    params[name] = int(value)
+                elif kind == 'bool':
+                    params[name] = parse_bool(value)
+                else:
+                    params[name] = value
+            except ValueError:
+                raise ValueError(f'Valor inválido para {name}: {value}')
+        return params
+
+def build_registry(endpoint_mapping):
+    """Registro dos datasets consultáveis, um DatasetSpec por entrada do mapeamento"""
+    return {name: DatasetSpec(name, schema) for name, schema in endpoint_mapping.items()}
+
+class QueryPlan:
+    """Plano compilado para um formato de consulta (conjunto de filtros presentes, sem os valores)
+
+    Os filtros com índice são resolvidos pelo DatasetIndex, que parte da lista candidata mais
+    seletiva conforme a cardinalidade de cada índice; os filtros de faixa das métricas, de
+    categoria e de subtotal são aplicados depois, apenas às posições que sobraram.
+    """
+
+    def __init__(self, spec, shape):
+        self.spec = spec
+        self.shape = shape
+        self.indexed = [name for name in shape if name in ('ano', 'ano_inicio', 'ano_fim', spec.entity_field)]
+        self.by_category = spec.category_field is not None and spec.category_field in shape
+        self.by_subtotal = 'subtotal' in shape
+        self.ranges = {}
+        for metric in spec.metrics:
+            bounds = (f'{metric}_min' in shape, f'{metric}_max' in shape)
+            if any(bounds):
+                self.ranges[metric] = bounds
+        self.has_residual = bool(self.ranges) or self.by_category or self.by_subtotal
+
+    def index_criteria(self, params):
+        return {
+            'anos': params.get('ano'),
+            'ano_inicio': params.get('ano_inicio'),
+            'ano_fim': params.get('ano_fim'),
+            'entidade': params.get(self.spec.entity_field)
+        }
+
+    def residual(self, dataset, params):
+        """Predicado dos filtros avaliados por posição (None quando a consulta não tem nenhum)"""
+        if not self.has_residual:
+            return None
+        index = dataset.index
+        category_ids = index.match_categories(params[self.spec.category_field]) if self.by_category else None
+        subtotal = params['subtotal'] if self.by_subtotal else None
+        cells = dataset.cells
+        checks = []
+        for metric, (has_min, has_max) in self.ranges.items():
+            if metric not in dataset.columns:
+                # Métrica ausente do dataset (ex.: cache migrado sem quantidade): nenhum registro atende
+                return lambda row: False
+            low = params[f'{metric}_min'] if has_min else None
+            high = params[f'{metric}_max'] if has_max else None
+            checks.append((dataset.columns[metric], low, high))
+
+        def check(row):
+            if category_ids is not None and index.row_category[row] not in category_ids:
+                return False
+            if subtotal is not None and bool(index.row_subtotal[row]) != subtotal:
+                return False
+            cell = cells[row]
+            for values, low, high in checks:
+                value = values[cell]
+                if low is not None and value < low:
+                    return False
+                if high is not None and value > high:
+                    return False
+            return True
+
+        return check
+
+    def select(self, dataset, params):
+        """Posições que atendem à consulta, em ordem (None quando não há filtro)"""
+        rows = dataset.index.select(**self.index_criteria(params)) if self.indexed else None
+        check = self.residual(dataset, params)
+        if check is None:
+            return rows
+        if rows is None:
+            rows = range(len(dataset.cells))
+        return array('I', (row for row in rows if check(row)))
+
+    def iter(self, dataset, params, start=0):
+        """Gera as posições a partir de `start` sob demanda, para a paginação por cursor"""
+        rows = dataset.index.iter_select(start=start, **self.index_criteria(params))
+        check = self.residual(dataset, params)
+        if check is None:
+            return rows
+        return (row for row in rows if check(row))
+
+    def count(self, dataset, params, exact=False):
+        """Total da consulta pela cardinalidade dos índices; com interseção ou faixas, só com `exact`"""
+        if not self.has_residual:
+            return dataset.index.count(exact=exact, **self.index_criteria(params))
+        if not exact:
+            return None
+        return len(self.select(dataset, params))
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+def compile_plan(spec, params):
+    """Plano da consulta, reaproveitado entre consultas com o mesmo formato"""
+    shape = tuple(sorted(name for name in params if name in spec.filters))
+    key = (spec.name, shape)
+    plan = _plans.get(key)
+    if plan is None:
+        with _plans_lock:
+            plan = _plans.get(key)
+            if plan is None:
+                plan = _plans[key] = QueryPlan(spec, shape)
+    return plan
@@ -0,0 +1,84 @@
+import heapq
+import threading
+
+# Maior ranking calculado; pedidos com n menor recortam o mesmo resultado
+MAX_RANKING_SIZE = 100
+
+class DatasetRanking:
+    """Rankings (top N) de entidades por ano e métrica de uma versão do dataset
+
+    Usa a matriz (categoria, entidade) x ano das séries, sem os subtotais de categoria: só itens
+    entram no ranking e no total do ano. Para cada (ano, métrica) as maiores entidades são
+    selecionadas com um heap de tamanho MAX_RANKING_SIZE, sem ordenar a coluna inteira, e o
+    resultado fica guardado para as próximas requisições.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.entity_field = dataset.entity_field
+        self.category_field = dataset.category_field
+        self.metrics = tuple(dataset.columns)
+        self.years = list(dataset.years)
+        self._results = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def totals(self, metric):
+        """Total da métrica em cada ano (na ordem de `years`), somando só os itens"""
+        result = self._totals.get(metric)
+        if result is not None:
+            return result
+
+        matrix = self.dataset.series.matrix(metric)
+        if isinstance(matrix, list):
+            result = [sum(column) for column in zip(*matrix)] if matrix else [0] * len(self.years)
+        else:
+            result = matrix.sum(axis=0).tolist()
+
+        with self._lock:
+            self._totals[metric] = result
+        return result
+
+    def latest_year(self, metric):
+        """Ano mais recente com total diferente de zero na métrica (None quando não há nenhum)"""
+        for year, total in zip(reversed(self.years), reversed(self.totals(metric))):
+            if total:
+                return year
+        return None
+
+    def top(self, year, metric):
+        """([((categoria, entidade), valor)] em ordem decrescente, total do ano) para o ano e a métrica"""
+        key = (year, metric)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+
+        series = self.dataset.series
+        offset = self.years.index(year)
+        matrix = series.matrix(metric)
+        if isinstance(matrix, list):
+            values = [row[offset] for row in matrix]
+        else:
+            values = matrix[:, offset].tolist()
+
+        # Empates ficam na ordem de aparição das entidades no CSV
+        top_ids = heapq.nlargest(MAX_RANKING_SIZE, range(len(values)), key=values.__getitem__)
+        entries = [(series.keys[key_id], values[key_id]) for key_id in top_ids if values[key_id] > 0]
+        result = (entries, self.totals(metric)[offset])
+
+        with self._lock:
+            self._results[key] = result
+        return result
+
+    def ranking(self, year, metric, n):
+        """Registros do ranking: posição, entidade (e categoria), valor e participação (%) no total do ano"""
+        entries, total = self.top(year, metric)
+        records = []
+        for position, ((category, name), value) in enumerate(entries[:n], start=1):
+            record = {'posicao': position, self.entity_field: name}
+            if self.category_field:
+                record[self.category_field] = category
+            record[metric] = value
+            record['participacao'] = round(value / total * 100, 2) if total else None
+            records.append(record)
+        return records
@@ -0,0 +1,88 @@
+import os
+import random
+import threading
+import time
+import logging
+from app.services.dataset_store import dataset_store
+from app.utils.files import hold_file_lock
+
+logger = logging.getLogger(__name__)
+
+class DatasetRefresher:
+    """Renova periodicamente, em segundo plano, os datasets da Embrapa"""
+
+    def __init__(self, app):
+        self.app = app
+        self._stop = threading.Event()
+        self._thread = None
+        self._leader_lock = None
+
+    def get_delay(self, endpoint):
+        """Intervalo até a próxima renovação do dataset, com jitter para não sincronizar os downloads"""
+        interval = self.app.config['DATASET_REFRESH_INTERVALS'].get(endpoint, self.app.config['CACHE_DEFAULT_TIMEOUT'])
+        jitter = self.app.config['DATASET_REFRESH_JITTER'].get(endpoint, 0)
+        return max(1, interval + random.uniform(0, jitter))
+
+    def start(self):
+        """Inicia o thread de renovação (apenas uma vez por processo)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='dataset-refresher', daemon=True)
+        self._thread.start()
+        logger.info("Renovação de datasets em segundo plano iniciada")
+
+    def stop(self):
+        """Interrompe o thread de renovação"""
+        self._stop.set()
+
+    def is_leader(self):
+        """No modo compartilhado, apenas o processo que detém o lock do host renova os datasets"""
+        if not self.app.config['DATASET_SHARED_MODE']:
+            return True
+        if self._leader_lock is None:
+            from app.services.embrapa_service import CACHE_DIR
+            self._leader_lock = hold_file_lock(os.path.join(CACHE_DIR, 'refresher.lock'))
+            if self._leader_lock is not None:
+                logger.info(f"Processo {os.getpid()} assumiu a renovação dos datasets deste host")
+        return self._leader_lock is not None
+
+    def refresh(self, endpoints):
+        """Renova, em paralelo, os datasets informados dentro do contexto da aplicação"""
+        from app.services.embrapa_service import EmbrapaService
+        
+        with self.app.app_context():
+            try:
+                EmbrapaService().refresh_all(endpoints)
+            except Exception as e:
+                logger.error(f"Erro ao renovar {', '.join(endpoints)}: {e}")
+
+    def _run(self):
+        from app.services.embrapa_service import EmbrapaService
+        
+        with self.app.app_context():
+            endpoints = list(EmbrapaService().endpoint_mapping)
+        
+        # Datasets ainda não carregados são baixados logo após a inicialização, espalhados pelo jitter
+        now = time.monotonic()
+        next_run = {}
+        for endpoint in endpoints:
+            if dataset_store.get_entry(endpoint) is None:
+                next_run[endpoint] = now + random.uniform(0, self.app.config['DATASET_REFRESH_JITTER'].get(endpoint, 0))
+            else:
+                next_run[endpoint] = now + self.get_delay(endpoint)
+        
+        while not self._stop.is_set():
+            if not self.is_leader():
+                # Outro processo renova os datasets; tenta assumir caso ele termine
+                self._stop.wait(min(self.get_delay(endpoint) for endpoint in endpoints))
+                continue
+            
+            now = time.monotonic()
+            due = [endpoint for endpoint in endpoints if next_run[endpoint] <= now]
+            if due:
+                self.refresh(due)
+                for endpoint in due:
+                    next_run[endpoint] = time.monotonic() + self.get_delay(endpoint)
+            
+            self._stop.wait(max(0, min(next_run.values()) - time.monotonic()))
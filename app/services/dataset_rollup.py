@@ -0,0 +1,146 @@
+from itertools import combinations
+
+AGGREGATIONS = ('sum', 'avg', 'min', 'max')
+
+def decade(year):
+    return year // 10 * 10
+
+class Rollup:
+    """Agregados de um dataset por um conjunto de dimensões: grupo -> contagem, soma, mínimo e máximo"""
+
+    def __init__(self, dimensions, metrics):
+        self.dimensions = dimensions
+        self.metrics = metrics
+        self.groups = {}
+
+    def add(self, key, values):
+        group = self.groups.get(key)
+        if group is None:
+            self.groups[key] = [1, list(values), list(values), list(values)]
+            return
+        group[0] += 1
+        sums, mins, maxs = group[1], group[2], group[3]
+        for i, value in enumerate(values):
+            sums[i] += value
+            if value < mins[i]:
+                mins[i] = value
+            if value > maxs[i]:
+                maxs[i] = value
+
+    def result(self, agg, metrics=None):
+        """Lista de grupos (dicts), ordenada pelas dimensões, com a agregação pedida de cada métrica"""
+        metrics = metrics or self.metrics
+        positions = [self.metrics.index(metric) for metric in metrics]
+        rows = []
+        # Sem categoria (dados mock) a chave tem None, ordenado como texto vazio
+        for key in sorted(self.groups, key=lambda key: tuple('' if value is None else value for value in key)):
+            count, sums, mins, maxs = self.groups[key]
+            row = dict(zip(self.dimensions, key))
+            for metric, i in zip(metrics, positions):
+                if agg == 'sum':
+                    row[metric] = sums[i]
+                elif agg == 'avg':
+                    row[metric] = round(sums[i] / count, 2)
+                elif agg == 'min':
+                    row[metric] = mins[i]
+                else:
+                    row[metric] = maxs[i]
+            row['registros'] = count
+            rows.append(row)
+        return rows
+
+class DatasetRollups:
+    """Rollups de um dataset para todas as combinações de até duas dimensões, calculados uma vez por versão
+
+    Dimensões: `ano`, `decada`, o campo de entidade do dataset (produto, cultivar ou pais) e,
+    quando o dataset tem categorias, `categoria`. As linhas de subtotal ficam de fora: o total de
+    um ano é a soma dos itens, e o de uma categoria sai do agrupamento por categoria.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.dimensions = ('ano', 'decada', dataset.entity_field)
+        if dataset.category_field:
+            self.dimensions += (dataset.category_field,)
+        self.metrics = list(dataset.columns)
+        self.rollups = {}
+        self._results = {}
+
+        groupings = [(dimension,) for dimension in self.dimensions]
+        groupings += [pair for pair in combinations(self.dimensions, 2) if pair != ('ano', 'decada')]
+        for dimensions in groupings:
+            self.rollups[dimensions] = self.build(dimensions)
+
+    def build(self, dimensions, rows=None):
+        """Agrega as posições `rows` (todas, por padrão) pelas dimensões, sem as linhas de subtotal"""
+        dataset = self.dataset
+        subtotals = dataset.index.row_subtotal
+        columns = [dataset.columns[metric] for metric in self.metrics]
+        getters = [self.dimension_getter(dimension) for dimension in dimensions]
+
+        rollup = Rollup(dimensions, self.metrics)
+        if rows is None:
+            rows = range(len(dataset.cells))
+        for row in rows:
+            if subtotals[row]:
+                continue
+            cell = dataset.cells[row]
+            rollup.add(
+                tuple(getter(row) for getter in getters),
+                [values[cell] for values in columns]
+            )
+        return rollup
+
+    def dimension_getter(self, dimension):
+        index = self.dataset.index
+        if dimension == 'ano':
+            return index.row_year.__getitem__
+        if dimension == 'decada':
+            return lambda row: decade(index.row_year[row])
+        if dimension == self.dataset.category_field:
+            return lambda row: index.categories[index.row_category[row]]
+        return lambda row: index.entities[index.row_entity[row]]
+
+    def canonical(self, dimensions):
+        """Ordem das dimensões usada como chave dos rollups"""
+        return tuple(sorted(dimensions, key=self.dimensions.index))
+
+    def aggregate(self, dimensions, agg, metrics=None, rows=None):
+        """Resultado da agregação; sem filtro (`rows`) vem dos rollups pré-calculados, em O(grupos)"""
+        key = self.canonical(dimensions)
+        if rows is not None:
+            return self.build(key, rows).result(agg, metrics)
+
+        cache_key = (key, agg, tuple(metrics or ()))
+        result = self._results.get(cache_key)
+        if result is None:
+            result = self._results[cache_key] = self.rollups[key].result(agg, metrics)
+        return result
+
+    def check_subtotals(self):
+        """Confere cada subtotal do CSV contra a soma dos itens da categoria no mesmo ano
+
+        Retorna as divergências como (categoria, ano, métrica, subtotal, soma dos itens).
+        """
+        dataset = self.dataset
+        if not dataset.category_field:
+            return []
+        width = len(dataset.years)
+        marks = dataset.subtotal_cells
+        subtotal_rows = {category: row for row, category in enumerate(dataset.categories) if dataset.subtotals[row]}
+
+        mismatches = []
+        for metric, values in dataset.columns.items():
+            sums = {category: [0] * width for category in subtotal_rows}
+            for row, category in enumerate(dataset.categories):
+                if not dataset.subtotals[row] and category in sums:
+                    base = row * width
+                    totals = sums[category]
+                    for offset in range(width):
+                        totals[offset] += values[base + offset]
+            for category, row in subtotal_rows.items():
+                base = row * width
+                for offset, items in enumerate(sums[category]):
+                    if marks[base + offset] and values[base + offset] != items:
+                        mismatches.append((category, dataset.years[offset], metric, values[base + offset], items))
+        return mismatches
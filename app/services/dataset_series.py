@@ -0,0 +1,219 @@
+import threading
+from bisect import bisect_left, bisect_right
+from app.services.dataset_index import DatasetView
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional
+    np = None
+
+# Janela padrão da média móvel, em anos
+DEFAULT_WINDOW = 3
+
+# Quantidade máxima de combinações (métrica, janela) e (métrica, intervalo) guardadas por versão
+MAX_CACHED_SERIES = 64
+
+class DatasetSeries:
+    """Séries anuais por entidade de uma versão do dataset: valor, crescimento ano a ano,
+    média móvel e CAGR
+
+    Cada série é de uma entidade dentro da sua categoria (ex.: "Tinto" de "VINHO DE MESA" e "Tinto"
+    de "SUCO DE UVA" são séries diferentes); linhas repetidas do CSV com a mesma chave são somadas
+    numa matriz (categoria, entidade) x ano por métrica, sem os subtotais de categoria. Os
+    indicadores são calculados sobre a matriz inteira de uma vez e guardados por métrica e janela;
+    uma requisição só recorta os anos pedidos e monta as entidades da página.
+
+    O cálculo em Python puro é o caminho suportado (o NumPy não está em requirements.txt); quando
+    o NumPy está instalado, a mesma matriz é calculada de forma vetorizada.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.entity_field = dataset.entity_field
+        self.metrics = tuple(dataset.columns)
+        self.years = list(dataset.years)
+        self.category_field = dataset.category_field
+
+        # Chaves (categoria, entidade) distintas, na ordem do CSV, e a chave de cada linha da matriz
+        index = dataset.index
+        key_ids = {}
+        self.row_keys = [key_ids.setdefault(key, len(key_ids)) for key in zip(dataset.categories, dataset.names)]
+        self.keys = list(key_ids)
+        self.key_entities = [index.entity_ids[name] for _, name in self.keys]
+        self.key_categories = [index.category_ids[category] for category, _ in self.keys]
+        self._matrices = {}
+        self._indicators = {}
+        self._cagrs = {}
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """Calcula os indicadores de todas as métricas com a janela padrão"""
+        for metric in self.metrics:
+            self.indicators(metric, DEFAULT_WINDOW)
+
+    def matrix(self, metric):
+        """Matriz (categoria, entidade) x ano da métrica, somando as linhas do CSV de uma mesma chave
+
+        As células de subtotal de categoria ficam fora (zeradas), para não contar os itens duas vezes.
+        """
+        result = self._matrices.get(metric)
+        if result is not None:
+            return result
+
+        dataset = self.dataset
+        subtotal_cells = dataset.subtotal_cells
+        width = len(self.years)
+        if np is not None:
+            subtotals = np.frombuffer(subtotal_cells, dtype=np.uint8).reshape(len(dataset.names), width)
+            result = np.zeros((len(self.keys), width), dtype=np.int64)
+            np.add.at(result, np.array(self.row_keys, dtype=np.intp), np.where(subtotals, 0, dataset.matrix(metric)))
+        else:
+            values = dataset.columns[metric]
+            result = [[0] * width for _ in self.keys]
+            for row_id, key_id in enumerate(self.row_keys):
+                totals = result[key_id]
+                base = row_id * width
+                for offset in range(width):
+                    if not subtotal_cells[base + offset]:
+                        totals[offset] += values[base + offset]
+
+        with self._lock:
+            self._matrices[metric] = result
+        return result
+
+    def indicators(self, metric, window):
+        """(valores, crescimento %, média móvel) de todas as entidades, como listas entidade x ano
+
+        Crescimento e média móvel ficam None quando não há ano anterior com valor ou anos suficientes
+        para a janela.
+        """
+        key = (metric, window)
+        result = self._indicators.get(key)
+        if result is not None:
+            return result
+
+        matrix = self.matrix(metric)
+        if np is not None:
+            values = matrix.astype(np.float64)
+            growth = np.full(values.shape, np.nan)
+            previous = values[:, :-1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                growth[:, 1:] = np.where(previous > 0, (values[:, 1:] - previous) / previous * 100, np.nan)
+            moving = np.full(values.shape, np.nan)
+            if window <= values.shape[1]:
+                totals = np.cumsum(np.pad(values, ((0, 0), (1, 0))), axis=1)
+                moving[:, window - 1:] = (totals[:, window:] - totals[:, :-window]) / window
+            result = (matrix.tolist(), to_lists(growth), to_lists(moving))
+        else:
+            growth = []
+            moving = []
+            for values in matrix:
+                growth.append([None] + [
+                    round((current - previous) / previous * 100, 2) if previous > 0 else None
+                    for previous, current in zip(values, values[1:])
+                ])
+                averages = [None] * len(values)
+                total = 0
+                for offset, value in enumerate(values):
+                    total += value
+                    if offset >= window:
+                        total -= values[offset - window]
+                    if offset >= window - 1:
+                        averages[offset] = round(total / window, 2)
+                moving.append(averages)
+            result = (matrix, growth, moving)
+
+        with self._lock:
+            self.evict(self._indicators)
+            self._indicators[key] = result
+        return result
+
+    def cagr(self, metric, start, end):
+        """CAGR (%) de cada entidade entre as colunas `start` e `end` (inclusive) da matriz
+
+        None quando o valor inicial é zero, ou quando o intervalo tem um único ano.
+        """
+        key = (metric, start, end)
+        result = self._cagrs.get(key)
+        if result is not None:
+            return result
+
+        matrix = self.matrix(metric)
+        periods = self.years[end] - self.years[start]
+        if np is not None:
+            first = matrix[:, start].astype(np.float64)
+            last = matrix[:, end].astype(np.float64)
+            rates = np.full(first.shape, np.nan)
+            if periods > 0:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    rates = np.where(first > 0, (np.power(last / first, 1 / periods) - 1) * 100, np.nan)
+            result = to_lists(rates)
+        else:
+            result = [
+                round(((values[end] / values[start]) ** (1 / periods) - 1) * 100, 2)
+                if periods > 0 and values[start] > 0 else None
+                for values in matrix
+            ]
+
+        with self._lock:
+            self.evict(self._cagrs)
+            self._cagrs[key] = result
+        return result
+
+    @staticmethod
+    def evict(cache):
+        if len(cache) >= MAX_CACHED_SERIES:
+            del cache[next(iter(cache))]
+
+    def window(self, ano_inicio=None, ano_fim=None):
+        """Colunas da matriz [início, fim) dos anos pedidos"""
+        start = bisect_left(self.years, ano_inicio) if ano_inicio is not None else 0
+        end = bisect_right(self.years, ano_fim) if ano_fim is not None else len(self.years)
+        return start, end
+
+    def series(self, metric, window=DEFAULT_WINDOW, ano_inicio=None, ano_fim=None, entidade=None, categoria=None):
+        """Séries das entidades com dado no intervalo; cada série só é montada quando lida (ex.: a página pedida)"""
+        start, end = self.window(ano_inicio, ano_fim)
+        if start >= end:
+            return []
+
+        values, growth, moving = self.indicators(metric, window)
+        rates = self.cagr(metric, start, end - 1)
+
+        index = self.dataset.index
+        entity_ids = index.match_filter(entidade) if entidade else None
+        category_ids = index.match_categories(categoria) if categoria and self.category_field else None
+        key_ids = [
+            key_id for key_id in range(len(self.keys))
+            if (entity_ids is None or self.key_entities[key_id] in entity_ids)
+            and (category_ids is None or self.key_categories[key_id] in category_ids)
+            and any(values[key_id][start:end])
+        ]
+
+        years = self.years
+        entity_field = self.entity_field
+        category_field = self.category_field
+
+        def build(key_id):
+            category, name = self.keys[key_id]
+            series = {entity_field: name}
+            if category_field:
+                series[category_field] = category
+            series['cagr'] = rates[key_id]
+            series['serie'] = [
+                {
+                    'ano': years[offset],
+                    'valor': values[key_id][offset],
+                    'crescimento': growth[key_id][offset],
+                    'media_movel': moving[key_id][offset]
+                }
+                for offset in range(start, end)
+            ]
+            return series
+
+        return DatasetView(self.dataset, key_ids, build)
+
+def to_lists(values):
+    """ndarray de floats em listas Python, arredondado a 2 casas e com NaN como None"""
+    rounded = np.round(values, 2)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
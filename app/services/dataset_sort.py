@@ -0,0 +1,97 @@
+import threading
+from array import array
+from bisect import bisect_left
+
+# Quantidade máxima de ordenações compostas (ex.: -quantidade,ano) guardadas por versão
+MAX_COMPOSITE_ORDERS = 64
+
+def parse_sort(value, fields):
+    """Converte `sort=-quantidade,ano` em ((campo, decrescente), ...); ValueError para campos desconhecidos"""
+    spec = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        descending = part.startswith('-')
+        field = part.lstrip('+-')
+        if field not in fields:
+            raise ValueError(f'Campo de ordenação inválido: {field}; use: {", ".join(fields)}')
+        if field not in (name for name, _ in spec):
+            spec.append((field, descending))
+    return tuple(spec)
+
+class DatasetSorter:
+    """Permutações de ordenação de uma versão do dataset
+
+    Para cada ordenação guarda a permutação (posições na ordem pedida) e o rank de cada posição.
+    As ordenações por um único campo são calculadas junto com os índices; as compostas, no
+    primeiro uso. Empates mantêm a ordem original dos registros.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.fields = ('ano', dataset.entity_field) + tuple(dataset.columns)
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """Calcula as ordenações por um único campo, crescente e decrescente"""
+        for field in self.fields:
+            self.order(((field, False),))
+            self.order(((field, True),))
+
+    def key_values(self, field):
+        """Valor de ordenação de cada posição do dataset"""
+        dataset = self.dataset
+        index = dataset.index
+        if field == 'ano':
+            return index.row_year
+        if field == dataset.entity_field:
+            names = [name.lower() for name in index.entities]
+            return [names[entity_id] for entity_id in index.row_entity]
+        values = dataset.columns[field]
+        return [values[cell] for cell in dataset.cells]
+
+    def order(self, spec):
+        """(permutação, rank) de uma ordenação"""
+        result = self._orders.get(spec)
+        if result is not None:
+            return result
+
+        permutation = list(range(len(self.dataset.cells)))
+        # Ordenações estáveis sucessivas, do campo menos para o mais significativo
+        for field, descending in reversed(spec):
+            values = self.key_values(field)
+            permutation.sort(key=values.__getitem__, reverse=descending)
+        permutation = array('I', permutation)
+        rank = array('I', bytes(4 * len(permutation)))
+        for position, row in enumerate(permutation):
+            rank[row] = position
+
+        with self._lock:
+            if len(spec) > 1 and len(self._orders) >= MAX_COMPOSITE_ORDERS + 2 * len(self.fields):
+                composite = next(key for key in self._orders if len(key) > 1)
+                del self._orders[composite]
+            self._orders[spec] = (permutation, rank)
+        return permutation, rank
+
+    def sort_rows(self, rows, spec):
+        """Ordena posições filtradas (`rows`, ou todas com None) sem ordenar o dataset inteiro
+
+        Resultados pequenos são ordenados pelo rank pré-calculado; quando o resultado é uma parte
+        grande do dataset, a permutação é percorrida uma vez filtrando pelas posições.
+        """
+        permutation, rank = self.order(spec)
+        if rows is None:
+            return permutation
+        if len(rows) * 8 < len(permutation):
+            return array('I', sorted(rows, key=rank.__getitem__))
+        selected = bytearray(len(permutation))
+        for row in rows:
+            selected[row] = 1
+        return array('I', (row for row in permutation if selected[row]))
+
+    def seek(self, rows, spec, start):
+        """Índice, em `rows` já ordenadas, do primeiro registro com rank >= start"""
+        _, rank = self.order(spec)
+        return bisect_left(rows, start, key=rank.__getitem__)
@@ -0,0 +1,99 @@
+import threading
+import time
+import logging
+from app.services.response_cache import invalidate_responses
+
+logger = logging.getLogger(__name__)
+
+class DatasetEntry:
+    """Snapshot de um dataset já processado mantido em memória"""
+
+    __slots__ = ('data', 'source', 'loaded_at', 'generation', 'snapshot')
+
+    def __init__(self, data, source, generation, loaded_at=None, snapshot=None):
+        self.data = data
+        self.source = source
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        self.generation = generation
+        # (identidade do arquivo no stat, geração do cabeçalho) do snapshot de onde os dados vieram (modo compartilhado)
+        self.snapshot = snapshot
+
+    def age(self):
+        """Idade do snapshot em segundos"""
+        return time.time() - self.loaded_at
+
+class DatasetStore:
+    """Armazenamento em memória, compartilhado pelo processo, dos datasets da Embrapa"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._generation = 0
+
+    def get_entry(self, endpoint):
+        """Retorna o snapshot atual do dataset, mesmo que expirado"""
+        return self._entries.get(endpoint)
+
+    def get(self, endpoint, timeout):
+        """Retorna os dados do dataset se o snapshot ainda estiver dentro do TTL"""
+        entry = self._entries.get(endpoint)
+        if entry is None:
+            return None
+        if timeout is not None and entry.age() > timeout:
+            return None
+        return entry.data
+
+    def put(self, endpoint, data, source, loaded_at=None, generation=None, snapshot=None):
+        """Publica um novo snapshot do dataset
+        
+        `loaded_at`, `generation` e `snapshot` permitem adotar um snapshot gravado por outro
+        processo, mantendo a idade e a geração definidas por ele.
+        """
+        current = self._entries.get(endpoint)
+        if current is None or current.data is not data:
+            # Índices e rollups de uma nova versão ficam prontos antes de ela ser publicada
+            data.prepare()
+
+        with self._lock:
+            entry = self._entries.get(endpoint)
+            if entry is not None and entry.data is data:
+                # Dados inalterados: apenas renova o TTL, mantendo a geração
+                entry.loaded_at = loaded_at if loaded_at is not None else time.time()
+                entry.source = source
+                if snapshot is not None:
+                    entry.snapshot = snapshot
+                return entry
+            
+            if generation is None:
+                self._generation += 1
+                generation = self._generation
+            entry = DatasetEntry(data, source, generation, loaded_at, snapshot)
+            self._entries[endpoint] = entry
+        # Respostas da versão anterior não serão mais usadas
+        invalidate_responses(endpoint)
+        logger.info(f"Dataset {endpoint} atualizado em memória (fonte: {source}, geração: {entry.generation})")
+        return entry
+
+    def load_lock(self, endpoint):
+        """Lock por dataset para que apenas um thread recarregue os dados por vez"""
+        with self._lock:
+            lock = self._load_locks.get(endpoint)
+            if lock is None:
+                lock = self._load_locks[endpoint] = threading.Lock()
+            return lock
+
+    def stats(self):
+        """Resumo dos snapshots em memória"""
+        return {
+            endpoint: {
+                'source': entry.source,
+                'generation': entry.generation,
+                'age': round(entry.age(), 3),
+                'records': len(entry.data)
+            }
+            for endpoint, entry in list(self._entries.items())
+        }
+
+# Instância única por processo
+dataset_store = DatasetStore()
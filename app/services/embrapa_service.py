@@ -1,44 +1,148 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import json
 import os
-import csv
-import io
+import hashlib
 from datetime import datetime
 from flask import current_app
+from app.services.dataset import Dataset
+from app.services.circuit_breaker import get_circuit_breaker
+from app.services.dataset_query import build_registry
+from app.services.dataset_store import dataset_store
+from app.services.snapshot import read_snapshot, read_snapshot_header, write_snapshot
+from app.utils.files import atomic_write, file_lock
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 
 logger = logging.getLogger(__name__)
 
+CACHE_DIR = 'data/cache'
+
+# Tamanho dos blocos lidos da resposta HTTP ao processar o CSV em streaming
+CSV_CHUNK_SIZE = 64 * 1024
+
+# Resultado de download_csv_data quando o CSV da Embrapa não mudou desde o último download
+NOT_MODIFIED = object()
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Sessão HTTP compartilhada pelo processo (keep-alive, pool de conexões e retries)"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                retry = Retry(
+                    total=current_app.config['EMBRAPA_MAX_RETRIES'],
+                    backoff_factor=current_app.config['EMBRAPA_RETRY_BACKOFF'],
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=('GET', 'HEAD')
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=current_app.config['EMBRAPA_POOL_SIZE'],
+                    pool_maxsize=current_app.config['EMBRAPA_POOL_SIZE'],
+                    max_retries=retry
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _http_session = session
+    return _http_session
+
+def _reset_http_session():
+    """Após um fork (ex.: gunicorn com preload) o processo filho não pode reutilizar os sockets do pai"""
+    global _http_session, _http_session_lock
+    _http_session = None
+    _http_session_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_http_session)
+
+# Última verificação do snapshot em disco por endpoint (modo compartilhado), por processo
+_snapshot_checks = {}
+
+# Momento em que a versão atual de cada dataset foi gravada: endpoint -> (versão, timestamp)
+_last_modified = {}
+
+# Mapeamento dos endpoints para URLs, arquivos CSV e esquema de parse de cada dataset
+ENDPOINT_MAPPING = {
+    'producao': {
+        'url': 'index.php?opcao=opt_02',
+        'csv_file': 'download/Producao.csv',
+        'delimiter': ';',
+        'entity_column': 'produto',
+        'entity_field': 'produto',
+        'ignore': ('PRODUTO', 'CONTROL'),
+        # Linhas de categoria (controle em maiúsculas) são o subtotal dos itens abaixo delas
+        'category_column': 'control',
+        'category_field': 'categoria',
+        'constants': {'unidade': 'litros'}
+    },
+    'processamento': {
+        'url': 'index.php?opcao=opt_03',
+        'csv_file': 'download/ProcessaViniferas.csv',
+        'delimiter': ';',
+        'entity_column': 'cultivar',
+        'entity_field': 'cultivar',
+        'ignore': ('CULTIVAR', 'CONTROL'),
+        'category_column': 'control',
+        'category_field': 'categoria',
+        'constants': {'unidade': 'kg'}
+    },
+    'comercializacao': {
+        'url': 'index.php?opcao=opt_04',
+        'csv_file': 'download/Comercio.csv',
+        'delimiter': ';',
+        'entity_column': 'Produto',
+        'entity_field': 'produto',
+        'ignore': ('PRODUTO', 'CONTROL'),
+        'category_column': 'control',
+        'category_field': 'categoria',
+        'constants': {'unidade': 'litros'}
+    },
+    'importacao': {
+        'url': 'index.php?opcao=opt_05',
+        'csv_file': 'download/ImpVinhos.csv',
+        'delimiter': '\t',
+        'entity_column': 'País',
+        'entity_field': 'pais',
+        'ignore': ('PAÍS', 'CONTROL'),
+        # Cada ano aparece duas vezes: quantidade (kg) e valor (US$)
+        'metrics': ('quantidade', 'valor'),
+        'constants': {'unidade': 'kg', 'tipo': 'importacao'}
+    },
+    'exportacao': {
+        'url': 'index.php?opcao=opt_06',
+        'csv_file': 'download/ExpVinho.csv',
+        'delimiter': '\t',
+        'entity_column': 'País',
+        'entity_field': 'pais',
+        'ignore': ('PAÍS', 'CONTROL'),
+        # Cada ano aparece duas vezes: quantidade (kg) e valor (US$)
+        'metrics': ('quantidade', 'valor'),
+        'constants': {'unidade': 'kg', 'tipo': 'exportacao'}
+    }
+}
+
+# Campos e filtros consultáveis de cada dataset (rota /<dataset>/query e listagens)
+DATASET_REGISTRY = build_registry(ENDPOINT_MAPPING)
+
 class EmbrapaService:
     def __init__(self):
         self.base_url = current_app.config['EMBRAPA_BASE_URL']
-        self.cache_dir = 'data/cache'
+        self.cache_dir = CACHE_DIR
         self.ensure_cache_dir()
         
-        # Mapeamento dos endpoints para URLs e arquivos CSV
-        self.endpoint_mapping = {
-            'producao': {
-                'url': 'index.php?opcao=opt_02',
-                'csv_file': 'download/Producao.csv'
-            },
-            'processamento': {
-                'url': 'index.php?opcao=opt_03',
-                'csv_file': 'download/ProcessaViniferas.csv'
-            },
-            'comercializacao': {
-                'url': 'index.php?opcao=opt_04',
-                'csv_file': 'download/Comercio.csv'
-            },
-            'importacao': {
-                'url': 'index.php?opcao=opt_05',
-                'csv_file': 'download/ImpVinhos.csv'
-            },
-            'exportacao': {
-                'url': 'index.php?opcao=opt_06',
-                'csv_file': 'download/ExpVinho.csv'
-            }
-        }
+        # Validadores HTTP (ETag/Last-Modified) e hash do último CSV baixado, por endpoint
+        self.validators = {}
+        
+        self.endpoint_mapping = ENDPOINT_MAPPING
+        self.registry = DATASET_REGISTRY
     
     def ensure_cache_dir(self):
         """Garante que o diretório de cache existe"""
@@ -46,294 +150,540 @@ class EmbrapaService:
             os.makedirs(self.cache_dir)
     
     def get_cached_data(self, endpoint):
-        """Recupera dados do cache"""
-        cache_file = os.path.join(self.cache_dir, f"{endpoint}.json")
+        """Recupera dados do cache (snapshot binário ou, para migração, o JSON legado)"""
+        cache_file = os.path.join(self.cache_dir, f"{endpoint}.bin")
         if os.path.exists(cache_file):
             try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                data, meta = read_snapshot(cache_file, self.endpoint_mapping[endpoint])
+                return {'data': data, **meta}
             except Exception as e:
                 logger.error(f"Erro ao ler cache {cache_file}: {e}")
+        
+        legacy_file = os.path.join(self.cache_dir, f"{endpoint}.json")
+        if os.path.exists(legacy_file):
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                records = cached['data']
+                metrics = self.endpoint_mapping[endpoint].get('metrics', ())
+                if 'valor' in metrics and records and 'valor' not in records[0]:
+                    # O JSON anterior só guardava a última coluna de cada ano, que é o valor (US$);
+                    # a quantidade não existe nesse cache e fica fora dos registros migrados
+                    records = [{**record, 'valor': record.get('quantidade', 0)} for record in records]
+                    metrics = ('valor',)
+                else:
+                    metrics = None
+                cached['data'] = self.build_dataset(endpoint, records, metrics)
+                logger.info(f"Migrando cache JSON de {endpoint} para o formato binário")
+                if self.write_snapshot_file(endpoint, cached['data'], cached.get('timestamp'), cached.get('source')):
+                    # O snapshot migrado mantém a idade do JSON, para não parecer recém-verificado
+                    legacy_mtime = os.path.getmtime(legacy_file)
+                    os.utime(cache_file, (legacy_mtime, legacy_mtime))
+                return cached
+            except Exception as e:
+                logger.error(f"Erro ao ler cache {legacy_file}: {e}")
         return None
     
+    def get_cache_lock(self, endpoint):
+        """Lock entre workers para escrita do cache de um endpoint"""
+        return file_lock(os.path.join(self.cache_dir, f"{endpoint}.lock"))
+    
+    def get_cached_header(self, endpoint):
+        """Metadados do snapshot em disco (hash do conteúdo, geração), lidos apenas do cabeçalho"""
+        cache_file = os.path.join(self.cache_dir, f"{endpoint}.bin")
+        try:
+            with open(cache_file, 'rb') as f:
+                return read_snapshot_header(f)['meta']
+        except (OSError, ValueError, KeyError):
+            return {}
+    
+    def write_snapshot_file(self, endpoint, data, timestamp=None, source='embrapa_scraping'):
+        """Grava o snapshot binário do dataset, se o conteúdo mudou
+        
+        A escrita é atômica (arquivo temporário + rename) e coordenada entre workers por um
+        lock de arquivo. Cada escrita incrementa a geração do snapshot; quando o conteúdo não
+        mudou, apenas a data de modificação do arquivo é renovada (última verificação).
+        Retorna True quando o snapshot em disco corresponde a `data`.
+        """
+        cache_file = os.path.join(self.cache_dir, f"{endpoint}.bin")
+        try:
+            with self.get_cache_lock(endpoint):
+                current = self.get_cached_header(endpoint)
+                if current.get('content_hash') == data.version:
+                    logger.info(f"Cache de {endpoint} já está atualizado; escrita ignorada")
+                    os.utime(cache_file)
+                    return True
+                
+                # Leitores podem estar com o snapshot anterior mapeado em memória: nunca sobrescrever no lugar
+                with atomic_write(cache_file) as f:
+                    write_snapshot(
+                        f, data,
+                        timestamp=timestamp or datetime.now().isoformat(),
+                        source=source or 'embrapa_scraping',
+                        content_hash=data.version,
+                        generation=current.get('generation', 0) + 1
+                    )
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao salvar cache {cache_file}: {e}")
+            return False
+    
+    def touch_cache(self, endpoint):
+        """Marca o snapshot em disco como verificado agora (dados da Embrapa inalterados)"""
+        cache_file = os.path.join(self.cache_dir, f"{endpoint}.bin")
+        try:
+            os.utime(cache_file)
+        except OSError:
+            pass
+    
+    def sync_snapshot(self, endpoint, force=False):
+        """Modo compartilhado: adota o snapshot mais recente gravado em disco por qualquer processo
+        
+        A verificação custa um stat a cada DATASET_SHARED_CHECK_INTERVAL segundos; só quando o
+        arquivo mudou (inode, tamanho ou data de modificação) o cabeçalho é lido para comparar a
+        geração. Quando a geração muda, o novo snapshot é mapeado via mmap (sem cópia); a idade do
+        dataset passa a ser a da última verificação feita por qualquer worker. Sem force, uma
+        geração nova é adotada em segundo plano (mmap + prepare fora da requisição) enquanto a
+        atual segue servida.
+        """
+        now = time.monotonic()
+        last_check = _snapshot_checks.get(endpoint)
+        if not force and last_check is not None and now - last_check < current_app.config['DATASET_SHARED_CHECK_INTERVAL']:
+            return
+        _snapshot_checks[endpoint] = now
+        
+        cache_file = os.path.join(self.cache_dir, f"{endpoint}.bin")
+        try:
+            stat = os.stat(cache_file)
+        except OSError:
+            return
+        identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        
+        entry = dataset_store.get_entry(endpoint)
+        if entry is not None and entry.snapshot is not None and entry.snapshot[0] == identity:
+            return
+        
+        # O arquivo mudou: a geração do cabeçalho diz se os dados mudaram ou se ele só foi marcado
+        # como verificado por outro worker (ou se o sistema de arquivos reaproveitou o inode)
+        generation = self.get_cached_header(endpoint).get('generation')
+        if generation is None:
+            return
+        if entry is not None and entry.snapshot is not None and entry.snapshot[1] == generation:
+            entry.snapshot = (identity, generation)
+            entry.loaded_at = max(entry.loaded_at, stat.st_mtime)
+            return
+        
+        if not force and entry is not None:
+            self.adopt_in_background(endpoint)
+            return
+        
+        try:
+            data, meta = read_snapshot(cache_file, self.endpoint_mapping[endpoint])
+        except Exception as e:
+            logger.error(f"Erro ao ler snapshot compartilhado {cache_file}: {e}")
+            return
+        # A geração lida junto com os dados prevalece, caso o arquivo tenha sido trocado desde o stat
+        snapshot = (identity, meta.get('generation'))
+        
+        if entry is not None and entry.snapshot is not None and entry.data.version == meta.get('content_hash'):
+            entry.snapshot = snapshot
+            entry.generation = meta.get('generation', entry.generation)
+            entry.loaded_at = max(entry.loaded_at, stat.st_mtime)
+            return
+        
+        dataset_store.put(
+            endpoint, data, 'snapshot',
+            loaded_at=stat.st_mtime,
+            generation=meta.get('generation'),
+            snapshot=snapshot
+        )
+    
+    def adopt_in_background(self, endpoint):
+        """Adota em um thread separado o snapshot gravado por outro processo"""
+        lock = dataset_store.load_lock(endpoint)
+        if lock.locked():
+            # Uma carga ou renovação em andamento adota o snapshot ao terminar
+            return
+        
+        app = current_app._get_current_object()
+        
+        def run():
+            with app.app_context():
+                if not lock.acquire(blocking=False):
+                    return
+                try:
+                    EmbrapaService().sync_snapshot(endpoint, force=True)
+                except Exception as e:
+                    logger.error(f"Erro ao adotar o snapshot de {endpoint}: {e}")
+                finally:
+                    lock.release()
+        
+        threading.Thread(target=run, name=f'snapshot-{endpoint}', daemon=True).start()
+    
+    def publish(self, endpoint, data, source):
+        """Publica um dataset carregado por este processo
+        
+        No modo compartilhado o snapshot que acabou de ser gravado é adotado direto (cópia via mmap),
+        para que o dataset seja preparado uma única vez, aqui, e não de novo na próxima requisição.
+        """
+        if current_app.config['DATASET_SHARED_MODE']:
+            self.sync_snapshot(endpoint, force=True)
+            entry = dataset_store.get_entry(endpoint)
+            if entry is not None and entry.data.version == data.version:
+                return
+        dataset_store.put(endpoint, data, source)
+    
+    def host_lock(self, endpoint, blocking=True):
+        """Lock entre processos para que apenas um worker por host baixe o dataset por vez"""
+        return file_lock(os.path.join(self.cache_dir, f"{endpoint}.refresh.lock"), blocking)
+    
     def save_to_cache(self, endpoint, data):
         """Salva dados no cache"""
-        cache_file = os.path.join(self.cache_dir, f"{endpoint}.json")
+        if not self.write_snapshot_file(endpoint, data):
+            return
+        
+        if endpoint in self.validators:
+            self.save_cache_meta(endpoint, self.validators[endpoint])
+    
+    def get_cache_meta(self, endpoint):
+        """Recupera os validadores (ETag, Last-Modified, hash) salvos junto ao cache"""
+        meta_file = os.path.join(self.cache_dir, f"{endpoint}.meta.json")
+        if os.path.exists(meta_file):
+            try:
+                with open(meta_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Erro ao ler metadados {meta_file}: {e}")
+        return {}
+    
+    def save_cache_meta(self, endpoint, meta):
+        """Salva os validadores do último CSV baixado junto ao cache"""
+        meta_file = os.path.join(self.cache_dir, f"{endpoint}.meta.json")
         try:
-            cache_data = {
-                'data': data,
-                'timestamp': datetime.now().isoformat(),
-                'source': 'embrapa_scraping'
-            }
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            with self.get_cache_lock(endpoint):
+                with atomic_write(meta_file, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f, ensure_ascii=False)
         except Exception as e:
-            logger.error(f"Erro ao salvar cache {cache_file}: {e}")
+            logger.error(f"Erro ao salvar metadados {meta_file}: {e}")
     
-    def download_csv_data(self, endpoint):
-        """Baixa e processa dados CSV da Embrapa"""
+    def download_csv_data(self, endpoint, conditional=True):
+        """Baixa e processa dados CSV da Embrapa
+        
+        O CSV é processado em streaming, linha a linha, durante o download, sem manter o corpo
+        inteiro em memória; o hash do conteúdo é calculado sobre as mesmas linhas. Com
+        conditional=True envia If-None-Match/If-Modified-Since e retorna NOT_MODIFIED quando o CSV
+        não mudou desde o último download (304, ou mesmo hash do conteúdo).
+        """
         try:
             if endpoint not in self.endpoint_mapping:
                 logger.error(f"Endpoint {endpoint} não encontrado no mapeamento")
                 return None
                 
+            breaker = get_circuit_breaker(endpoint, current_app.config)
+            if not breaker.allow():
+                # Embrapa indisponível: não espera o timeout, o chamador usa o snapshot/cache
+                logger.info(f"Circuito de {endpoint} aberto; download ignorado")
+                return None
+            
             csv_url = f"{self.base_url}/{self.endpoint_mapping[endpoint]['csv_file']}"
             logger.info(f"Baixando dados de: {csv_url}")
             
-            response = requests.get(csv_url, timeout=30)
-            response.raise_for_status()
+            meta = self.get_cache_meta(endpoint) if conditional else {}
+            headers = {}
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
             
-            if response.headers.get('content-type', '').startswith('text/html'):
-                logger.warning(f"Arquivo CSV não encontrado para {endpoint}")
-                return None
+            with get_http_session().get(
+                csv_url,
+                headers=headers,
+                timeout=current_app.config['EMBRAPA_TIMEOUT'],
+                stream=True
+            ) as response:
+                if response.status_code == 304:
+                    logger.info(f"CSV de {endpoint} não modificado (304)")
+                    breaker.record_success()
+                    return NOT_MODIFIED
+                
+                response.raise_for_status()
+                
+                if response.headers.get('content-type', '').startswith('text/html'):
+                    logger.warning(f"Arquivo CSV não encontrado para {endpoint}")
+                    breaker.record_failure("Resposta HTML no lugar do CSV")
+                    return None
+                
+                digest = hashlib.sha256()
+                data = Dataset.from_csv(endpoint, self.endpoint_mapping[endpoint], self.iter_csv_lines(response, digest))
+            
+            breaker.record_success()
+            
+            content_hash = digest.hexdigest()
+            self.validators[endpoint] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': content_hash
+            }
             
-            csv_content = response.content.decode('utf-8')
-            data = self.parse_csv_data(csv_content, endpoint)
+            if meta.get('content_hash') == content_hash:
+                # Sem validadores HTTP o parse já aconteceu durante o streaming; o resultado é
+                # descartado para manter o snapshot (e tudo o que depende da versão dele)
+                logger.info(f"CSV de {endpoint} idêntico ao último download; snapshot mantido")
+                if meta != self.validators[endpoint]:
+                    self.save_cache_meta(endpoint, self.validators[endpoint])
+                return NOT_MODIFIED
             
             return data
             
         except Exception as e:
             logger.error(f"Erro ao baixar dados CSV de {endpoint}: {e}")
+            get_circuit_breaker(endpoint, current_app.config).record_failure(e)
             return None
     
-    def parse_csv_data(self, csv_content, endpoint):
-        """Parse dos dados CSV baseado no endpoint"""
+    def iter_csv_lines(self, response, digest):
+        """Linhas do CSV decodificadas sob demanda, atualizando o hash do corpo"""
+        # Sem charset no Content-Type o requests assumiria ISO-8859-1; os CSVs da Embrapa são UTF-8
+        response.encoding = 'utf-8'
+        for line in response.iter_lines(chunk_size=CSV_CHUNK_SIZE, decode_unicode=True):
+            digest.update(line.encode('utf-8'))
+            digest.update(b'\n')
+            yield line
+    
+    def build_dataset(self, endpoint, records, metrics=None):
+        """Converte registros (cache JSON, mock) para o formato colunar do dataset"""
+        return Dataset.from_records(endpoint, self.endpoint_mapping[endpoint], records, metrics)
+    
+    def scrape_data(self, endpoint, params=None):
+        """Faz scraping dos dados da Embrapa"""
         try:
-            if endpoint in ['importacao', 'exportacao']:
-                csv_reader = csv.DictReader(io.StringIO(csv_content), delimiter='\t')
-            else:
-                csv_reader = csv.DictReader(io.StringIO(csv_content), delimiter=';')
-            
-            data = []
+            data = self.download_csv_data(endpoint)
             
-            for row in csv_reader:
-                if endpoint == 'producao':
-                    data.extend(self.parse_producao_row(row))
-                elif endpoint == 'processamento':
-                    data.extend(self.parse_processamento_row(row))
-                elif endpoint == 'comercializacao':
-                    data.extend(self.parse_comercializacao_row(row))
-                elif endpoint == 'importacao':
-                    data.extend(self.parse_importacao_row(row))
-                elif endpoint == 'exportacao':
-                    data.extend(self.parse_exportacao_row(row))
+            if data is NOT_MODIFIED:
+                current = self.get_current_data(endpoint)
+                if current is not None:
+                    self.touch_cache(endpoint)
+                    return current
+                # Sem cópia local dos dados: baixa o CSV completo
+                data = self.download_csv_data(endpoint, conditional=False)
             
-            return data
+            if data:
+                self.save_to_cache(endpoint, data)
+                return data
+            else:
+                logger.warning(f"Não foi possível obter dados CSV para {endpoint}")
+                return None
             
         except Exception as e:
-            logger.error(f"Erro ao fazer parse do CSV para {endpoint}: {e}")
-            return []
+            logger.error(f"Erro ao fazer scraping de {endpoint}: {e}")
+            return None
     
-    def parse_producao_row(self, row):
-        """Parse específico para dados de produção"""
-        data = []
-        produto = row.get('produto', '').strip()
+    def get_current_data(self, endpoint):
+        """Último dataset baixado da Embrapa (memória ou cache em disco), usado quando o CSV não mudou"""
+        entry = dataset_store.get_entry(endpoint)
+        if entry is not None and entry.source in ('embrapa_scraping', 'cache', 'snapshot'):
+            return entry.data
         
-        if not produto or produto.upper() in ['PRODUTO', 'CONTROL']:
-            return data
+        cached = self.get_cached_data(endpoint)
+        if cached:
+            return cached['data']
+        return None
+    
+    def get_last_modified(self, endpoint, entry):
+        """Timestamp da gravação do conteúdo atual do dataset, lido do cabeçalho do snapshot em disco
         
-        for year in range(1970, 2024):
-            year_str = str(year)
-            if year_str in row:
-                try:
-                    quantidade_str = row[year_str].strip()
-                    if quantidade_str and quantidade_str not in ['', '0', 'nd', '*']:
-                        # Remover caracteres não numéricos exceto vírgula e ponto
-                        quantidade_str = quantidade_str.replace(',', '.')
-                        quantidade = float(quantidade_str)
-                        
-                        data.append({
-                            'ano': year,
-                            'produto': produto,
-                            'quantidade': int(quantidade),
-                            'unidade': 'litros'
-                        })
-                except (ValueError, TypeError):
-                    continue
+        O cabeçalho é lido uma vez por versão; sem snapshot dessa versão (ex.: dados mock), vale o
+        momento em que ela foi publicada em memória.
+        """
+        version = entry.data.version
+        cached = _last_modified.get(endpoint)
+        if cached is not None and cached[0] == version:
+            return cached[1]
         
-        return data
+        modified = entry.loaded_at
+        meta = self.get_cached_header(endpoint)
+        if meta.get('content_hash') == version and meta.get('timestamp'):
+            try:
+                modified = datetime.fromisoformat(meta['timestamp']).timestamp()
+            except ValueError:
+                pass
+        _last_modified[endpoint] = (version, modified)
+        return modified
+    
+    def get_timeout(self, endpoint):
+        """TTL (segundos) do dataset em memória"""
+        timeouts = current_app.config.get('CACHE_TIMEOUTS', {})
+        return timeouts.get(endpoint, current_app.config['CACHE_DEFAULT_TIMEOUT'])
     
-    def parse_processamento_row(self, row):
-        """Parse específico para dados de processamento"""
-        data = []
-        cultivar = row.get('cultivar', '').strip()
+    def get_data(self, endpoint, params=None, use_cache=True):
+        """Método principal para obter dados, servindo do armazenamento em memória quando possível"""
+        shared = current_app.config['DATASET_SHARED_MODE']
         
-        if not cultivar or cultivar.upper() in ['CULTIVAR', 'CONTROL']:
-            return data
+        if use_cache:
+            if shared:
+                self.sync_snapshot(endpoint)
+            entry = dataset_store.get_entry(endpoint)
+            if entry is not None:
+                if entry.age() <= self.get_timeout(endpoint):
+                    return entry.data
+                if current_app.config.get('DATASET_STALE_WHILE_REVALIDATE', True):
+                    # Snapshot expirado: serve o último válido e renova em segundo plano
+                    self.refresh_in_background(endpoint)
+                    return entry.data
         
-        for year in range(1970, 2024):
-            year_str = str(year)
-            if year_str in row:
-                try:
-                    quantidade_str = row[year_str].strip()
-                    if quantidade_str and quantidade_str not in ['', '0', 'nd', '*']:
-                        quantidade_str = quantidade_str.replace(',', '.')
-                        quantidade = float(quantidade_str)
-                        
-                        data.append({
-                            'ano': year,
-                            'cultivar': cultivar,
-                            'quantidade': int(quantidade),
-                            'unidade': 'kg'
-                        })
-                except (ValueError, TypeError):
-                    continue
+        # Apenas um thread por dataset vai até a Embrapa; os demais aguardam o resultado
+        with dataset_store.load_lock(endpoint):
+            if use_cache:
+                data = dataset_store.get(endpoint, self.get_timeout(endpoint))
+                if data is not None:
+                    return data
+            
+            if shared:
+                # No modo compartilhado, apenas um worker por host faz o download
+                with self.host_lock(endpoint):
+                    if use_cache:
+                        self.sync_snapshot(endpoint, force=True)
+                        data = dataset_store.get(endpoint, self.get_timeout(endpoint))
+                        if data is not None:
+                            return data
+                    data, source = self.load_data(endpoint, params, use_cache)
+                    self.publish(endpoint, data, source)
+            else:
+                data, source = self.load_data(endpoint, params, use_cache)
+                dataset_store.put(endpoint, data, source)
         
         return data
     
-    def parse_comercializacao_row(self, row):
-        """Parse específico para dados de comercialização"""
-        data = []
-        produto = row.get('Produto', '').strip()
+    def refresh(self, endpoint, wait=True, if_stale=False):
+        """Baixa novamente o dataset e publica o novo snapshot, mantendo o anterior em caso de falha
         
-        if not produto or produto.upper() in ['PRODUTO', 'CONTROL']:
-            return data
-        
-        for year in range(1970, 2024):
-            year_str = str(year)
-            if year_str in row:
-                try:
-                    quantidade_str = row[year_str].strip()
-                    if quantidade_str and quantidade_str not in ['', '0', 'nd', '*']:
-                        quantidade_str = quantidade_str.replace(',', '.')
-                        quantidade = float(quantidade_str)
-                        
-                        data.append({
-                            'ano': year,
-                            'produto': produto,
-                            'quantidade': int(quantidade),
-                            'unidade': 'litros'
-                        })
-                except (ValueError, TypeError):
-                    continue
+        Com if_stale=True a renovação é ignorada se outro worker acabou de renovar o dataset.
+        """
+        lock = dataset_store.load_lock(endpoint)
+        if not lock.acquire(blocking=wait):
+            # Já existe uma renovação deste dataset em andamento
+            return False
+        try:
+            if not current_app.config['DATASET_SHARED_MODE']:
+                return self._refresh(endpoint)
+            
+            with self.host_lock(endpoint, blocking=wait) as acquired:
+                if not acquired:
+                    # Outro worker deste host já está renovando o dataset
+                    return False
+                self.sync_snapshot(endpoint, force=True)
+                entry = dataset_store.get_entry(endpoint)
+                if if_stale and entry is not None and entry.age() <= self.get_timeout(endpoint):
+                    return True
+                return self._refresh(endpoint)
+        finally:
+            lock.release()
+    
+    def _refresh(self, endpoint):
+        data = self.scrape_data(endpoint)
+        if data is not None:
+            self.publish(endpoint, data, 'embrapa_scraping')
+            return True
         
-        return data
+        if dataset_store.get_entry(endpoint) is None:
+            data, source = self.load_fallback(endpoint)
+            self.publish(endpoint, data, source)
+        else:
+            logger.warning(f"Renovação de {endpoint} falhou; mantendo o snapshot anterior")
+        return False
     
-    def parse_importacao_row(self, row):
-        """Parse específico para dados de importação"""
-        data = []
-        pais = row.get('País', '').strip()
+    def refresh_all(self, endpoints=None, max_workers=None):
+        """Renova vários datasets em paralelo, com um pool de threads limitado
         
-        if not pais or pais.upper() in ['PAÍS', 'CONTROL']:
-            return data
+        Retorna um dicionário endpoint -> True quando os dados vieram da Embrapa.
+        """
+        app = current_app._get_current_object()
+        endpoints = list(endpoints or self.endpoint_mapping)
+        max_workers = max_workers or current_app.config['DATASET_REFRESH_WORKERS']
+        
+        def run(endpoint):
+            with app.app_context():
+                return EmbrapaService().refresh(endpoint)
+        
+        results = {}
+        if not endpoints:
+            return results
         
-        # Os arquivos de importação/exportação têm estrutura diferente
-        # Cada ano aparece duas vezes (quantidade e valor)
-        for year in range(1970, 2025):
-            year_str = str(year)
-            if year_str in row:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(endpoints)), thread_name_prefix='embrapa-refresh') as executor:
+            futures = {executor.submit(run, endpoint): endpoint for endpoint in endpoints}
+            for future in as_completed(futures):
+                endpoint = futures[future]
                 try:
-                    # Primeira coluna do ano é quantidade (kg)
-                    quantidade_str = row[year_str].strip()
-                    if quantidade_str and quantidade_str not in ['', '0', 'nd', '*']:
-                        quantidade_str = quantidade_str.replace(',', '.')
-                        quantidade = float(quantidade_str)
-                        
-                        data.append({
-                            'ano': year,
-                            'pais': pais,
-                            'quantidade': int(quantidade),
-                            'unidade': 'kg',
-                            'tipo': 'importacao'
-                        })
-                except (ValueError, TypeError):
-                    continue
+                    results[endpoint] = future.result()
+                except Exception as e:
+                    logger.error(f"Erro ao renovar {endpoint}: {e}")
+                    results[endpoint] = False
         
-        return data
+        return results
     
-    def parse_exportacao_row(self, row):
-        """Parse específico para dados de exportação"""
-        data = []
-        pais = row.get('País', '').strip()
+    def refresh_in_background(self, endpoint):
+        """Dispara a renovação do dataset em um thread separado"""
+        if dataset_store.load_lock(endpoint).locked():
+            return
         
-        if not pais or pais.upper() in ['PAÍS', 'CONTROL']:
-            return data
-
-        for year in range(1970, 2025):
-            year_str = str(year)
-            if year_str in row:
+        app = current_app._get_current_object()
+        
+        def run():
+            with app.app_context():
                 try:
-                    quantidade_str = row[year_str].strip()
-                    if quantidade_str and quantidade_str not in ['', '0', 'nd', '*']:
-                        quantidade_str = quantidade_str.replace(',', '.')
-                        quantidade = float(quantidade_str)
-                        
-                        data.append({
-                            'ano': year,
-                            'pais': pais,
-                            'quantidade': int(quantidade),
-                            'unidade': 'kg',
-                            'tipo': 'exportacao'
-                        })
-                except (ValueError, TypeError):
-                    continue
+                    EmbrapaService().refresh(endpoint, wait=False, if_stale=True)
+                except Exception as e:
+                    logger.error(f"Erro ao renovar {endpoint} em segundo plano: {e}")
         
-        return data
+        threading.Thread(target=run, name=f'refresh-{endpoint}', daemon=True).start()
     
-    def scrape_data(self, endpoint, params=None):
-        """Faz scraping dos dados da Embrapa"""
-        try:
-            data = self.download_csv_data(endpoint)
-            
-            if data:
-                self.save_to_cache(endpoint, data)
-                return data
-            else:
-                logger.warning(f"Não foi possível obter dados CSV para {endpoint}")
-                return None
-            
-        except Exception as e:
-            logger.error(f"Erro ao fazer scraping de {endpoint}: {e}")
-            return None
-    
-    def get_data(self, endpoint, params=None, use_cache=True):
-        """Método principal para obter dados com fallback"""
+    def load_data(self, endpoint, params=None, use_cache=True):
+        """Carrega os dados com fallback (scraping -> cache em disco -> mock)"""
         # Tentar scraping primeiro
         data = self.scrape_data(endpoint, params)
+        if data is not None:
+            return data, 'embrapa_scraping'
         
-        if data is None and use_cache:
+        return self.load_fallback(endpoint, use_cache)
+    
+    def load_fallback(self, endpoint, use_cache=True):
+        """Dados usados quando o scraping falha (cache em disco -> mock)"""
+        if use_cache:
             # Fallback para cache
             logger.info(f"Usando dados em cache para {endpoint}")
             cached = self.get_cached_data(endpoint)
             if cached:
-                return cached['data']
-        
-        if data is None:
-            logger.info(f"Usando dados mock para {endpoint}")
-            mock_data = {
-                'producao': self.get_mock_producao_data(),
-                'processamento': self.get_mock_processamento_data(),
-                'comercializacao': self.get_mock_comercializacao_data(),
-                'importacao': self.get_mock_importacao_data(),
-                'exportacao': self.get_mock_exportacao_data()
-            }
-            data = mock_data.get(endpoint, [])
+                return cached['data'], 'cache'
         
-        return data or []
+        logger.info(f"Usando dados mock para {endpoint}")
+        mock_data = {
+            'producao': self.get_mock_producao_data,
+            'processamento': self.get_mock_processamento_data,
+            'comercializacao': self.get_mock_comercializacao_data,
+            'importacao': self.get_mock_importacao_data,
+            'exportacao': self.get_mock_exportacao_data
+        }
+        return self.build_dataset(endpoint, mock_data[endpoint]()), 'mock'
     
     def get_mock_producao_data(self):
         """Dados mock para produção"""
         return [
+            {
+                "ano": 2022,
+                "produto": "Vinho de mesa",
+                "quantidade": 240000000,
+                "unidade": "litros"
+            },
             {
                 "ano": 2023,
                 "produto": "Vinho de mesa",
                 "quantidade": 250000000,
-                "unidade": "litros",
-                "regiao": "Rio Grande do Sul"
+                "unidade": "litros"
             },
             {
                 "ano": 2023,
                 "produto": "Vinho fino",
                 "quantidade": 45000000,
-                "unidade": "litros",
-                "regiao": "Rio Grande do Sul"
-            },
-            {
-                "ano": 2022,
-                "produto": "Vinho de mesa",
-                "quantidade": 240000000,
-                "unidade": "litros",
-                "regiao": "Rio Grande do Sul"
+                "unidade": "litros"
             }
         ]
     
@@ -342,17 +692,15 @@ class EmbrapaService:
         return [
             {
                 "ano": 2023,
-                "tipo": "Viníferas",
+                "cultivar": "Viníferas",
                 "quantidade": 180000000,
-                "unidade": "kg",
-                "finalidade": "Elaboração"
+                "unidade": "kg"
             },
             {
                 "ano": 2023,
-                "tipo": "Americanas e híbridas",
+                "cultivar": "Americanas e híbridas",
                 "quantidade": 320000000,
-                "unidade": "kg",
-                "finalidade": "Elaboração"
+                "unidade": "kg"
             }
         ]
     
@@ -363,15 +711,13 @@ class EmbrapaService:
                 "ano": 2023,
                 "produto": "Vinho de mesa",
                 "quantidade": 200000000,
-                "unidade": "litros",
-                "mercado": "Nacional"
+                "unidade": "litros"
             },
             {
                 "ano": 2023,
                 "produto": "Espumante",
                 "quantidade": 15000000,
-                "unidade": "litros",
-                "mercado": "Nacional"
+                "unidade": "litros"
             }
         ]
     
@@ -380,19 +726,19 @@ class EmbrapaService:
         return [
             {
                 "ano": 2023,
-                "produto": "Vinhos de mesa",
+                "pais": "Argentina",
                 "quantidade": 5000000,
-                "unidade": "litros",
                 "valor": 15000000,
-                "pais_origem": "Argentina"
+                "unidade": "kg",
+                "tipo": "importacao"
             },
             {
                 "ano": 2023,
-                "produto": "Vinhos finos",
+                "pais": "Chile",
                 "quantidade": 2000000,
-                "unidade": "litros",
                 "valor": 25000000,
-                "pais_origem": "Chile"
+                "unidade": "kg",
+                "tipo": "importacao"
             }
         ]
     
@@ -401,18 +747,18 @@ class EmbrapaService:
         return [
             {
                 "ano": 2023,
-                "produto": "Vinhos de mesa",
+                "pais": "Paraguai",
                 "quantidade": 3000000,
-                "unidade": "litros",
                 "valor": 12000000,
-                "pais_destino": "Paraguai"
+                "unidade": "kg",
+                "tipo": "exportacao"
             },
             {
                 "ano": 2023,
-                "produto": "Suco de uva",
+                "pais": "Estados Unidos",
                 "quantidade": 8000000,
-                "unidade": "litros",
                 "valor": 20000000,
-                "pais_destino": "Estados Unidos"
+                "unidade": "kg",
+                "tipo": "exportacao"
             }
-        ] 
\ No newline at end of file
+        ]
\ No newline at end of file
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+
+class ResponseCache:
+    """Cache LRU de respostas já serializadas, limitado por quantidade de entradas e por bytes
+
+    As chaves trazem as versões dos datasets usados na resposta, então uma nova versão nunca
+    encontra respostas antigas; `invalidate` apenas libera a memória delas quando um snapshot novo
+    é publicado.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Resposta guardada para a chave (None quando não existe), marcada como a mais recente"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, datasets, body, mimetype):
+        """Guarda uma resposta (`datasets`: nomes dos datasets de que ela depende)"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1][0])
+            self._entries[key] = (datasets, (body, mimetype))
+            self.size += len(body)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, (evicted, _)) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, dataset=None):
+        """Descarta as respostas que dependem de um dataset (ou todas)"""
+        with self._lock:
+            for key, (datasets, (body, _)) in list(self._entries.items()):
+                if dataset is None or dataset in datasets:
+                    del self._entries[key]
+                    self.size -= len(body)
+
+    def status(self):
+        """Tamanho e contadores do cache (usado no /health)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache(config):
+    """Cache de respostas do processo, criado na primeira utilização"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    max_entries=config['RESPONSE_CACHE_MAX_ENTRIES'],
+                    max_bytes=config['RESPONSE_CACHE_MAX_BYTES']
+                )
+    return _cache
+
+def invalidate_responses(dataset=None):
+    """Descarta as respostas em cache de um dataset (ou de todos), se o cache já existir"""
+    if _cache is not None:
+        _cache.invalidate(dataset)
+
+def get_response_cache_status():
+    """Estado do cache de respostas (None enquanto não foi usado)"""
+    return _cache.status() if _cache is not None else None
@@ -0,0 +1,144 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from app.services.dataset import Dataset
+
+# Formato binário dos snapshots em data/cache/<endpoint>.bin
+#
+#   magic (8 bytes) | versão (uint16) | reservado (uint16) | tamanho do cabeçalho (uint32)
+#   cabeçalho JSON (metadados + tabela de seções), alinhado em 8 bytes
+#   seções de tamanho fixo, cada uma alinhada em 8 bytes:
+#     strings      bytes UTF-8 das entidades distintas (dicionário)
+#     string_index uint32, início de cada string no dicionário (n + 1 posições)
+#     names        uint32, id no dicionário da entidade de cada linha da matriz
+#     years        int32, anos (colunas da matriz)
+#     cells        uint32, posições da matriz que têm dado, na ordem original
+#     col:<métrica> int64, matriz entidade x ano da métrica (linha-major)
+#   e, nos datasets com categorias:
+#     categories   uint32, id no dicionário da categoria de cada linha (NO_CATEGORY sem categoria)
+#     subtotals    uint8, 1 nas linhas que são o subtotal de uma categoria
+#
+# Snapshots gravados antes das seções de categoria continuam válidos: a categoria é deduzida dos nomes.
+#
+# Os arrays são gravados na ordem de bytes little-endian e lidos via mmap sem cópia.
+SNAPSHOT_MAGIC = b'EMBRSNAP'
+# Versão 2: importação/exportação passam a ter as colunas quantidade e valor
+SNAPSHOT_VERSION = 2
+PREAMBLE = struct.Struct('<8sHHI')
+ALIGNMENT = 8
+NO_CATEGORY = 0xFFFFFFFF
+
+def _padding(size):
+    return (-size) % ALIGNMENT
+
+def _little_endian(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def write_snapshot(file, dataset, **meta):
+    """Grava o dataset no formato binário em um arquivo já aberto para escrita"""
+    strings = {}
+    for name in dataset.names:
+        strings.setdefault(name, len(strings))
+    if dataset.category_field:
+        for category in dataset.categories:
+            if category is not None:
+                strings.setdefault(category, len(strings))
+
+    blob = bytearray()
+    string_index = array('I', [0])
+    for name in strings:
+        blob.extend(name.encode('utf-8'))
+        string_index.append(len(blob))
+
+    sections = [
+        ('strings', 'B', bytes(blob)),
+        ('string_index', 'I', _little_endian(string_index)),
+        ('names', 'I', _little_endian(array('I', [strings[name] for name in dataset.names]))),
+        ('years', 'i', _little_endian(array('i', dataset.years))),
+        ('cells', 'I', _little_endian(array('I', dataset.cells)))
+    ]
+    if dataset.category_field:
+        categories = array('I', [NO_CATEGORY if category is None else strings[category] for category in dataset.categories])
+        sections.append(('categories', 'I', _little_endian(categories)))
+        sections.append(('subtotals', 'B', bytes(dataset.subtotals)))
+    for metric, values in dataset.columns.items():
+        sections.append((f'col:{metric}', 'q', _little_endian(array('q', values))))
+
+    # Os offsets dependem do tamanho do cabeçalho, que depende dos offsets: repete até estabilizar
+    header_size = 0
+    while True:
+        start = PREAMBLE.size + header_size + _padding(PREAMBLE.size + header_size)
+        offset = start
+        table = []
+        for name, typecode, payload in sections:
+            table.append({'name': name, 'type': typecode, 'offset': offset, 'size': len(payload)})
+            offset += len(payload) + _padding(len(payload))
+        header = json.dumps({
+            'endpoint': dataset.endpoint,
+            'rows': len(dataset.names),
+            'records': len(dataset.cells),
+            'columns': list(dataset.columns),
+            'sections': table,
+            'meta': meta
+        }, ensure_ascii=False).encode('utf-8')
+        if PREAMBLE.size + len(header) + _padding(PREAMBLE.size + len(header)) == start:
+            break
+        header_size = len(header)
+
+    file.write(PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(header)))
+    file.write(header)
+    file.write(b'\0' * _padding(PREAMBLE.size + len(header)))
+    for _, _, payload in sections:
+        file.write(payload)
+        file.write(b'\0' * _padding(len(payload)))
+
+def read_snapshot_header(file):
+    """Lê apenas o cabeçalho de um snapshot (arquivo aberto em modo binário)"""
+    magic, version, _, header_size = PREAMBLE.unpack(file.read(PREAMBLE.size))
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Arquivo não é um snapshot da Embrapa")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Versão de snapshot não suportada: {version}")
+    return json.loads(file.read(header_size).decode('utf-8'))
+
+def read_snapshot(path, schema):
+    """Carrega um snapshot via mmap; as colunas numéricas apontam direto para as páginas do arquivo
+
+    Retorna (dataset, metadados).
+    """
+    with open(path, 'rb') as f:
+        header = read_snapshot_header(f)
+        buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    sections = {}
+    for section in header['sections']:
+        view = buffer[section['offset']:section['offset'] + section['size']]
+        if section['type'] != 'B':
+            view = view.cast(section['type'])
+            if sys.byteorder != 'little':
+                view = array(section['type'], view)
+                view.byteswap()
+        sections[section['name']] = view
+
+    string_index = sections['string_index']
+    blob = sections['strings']
+    strings = [
+        str(blob[string_index[i]:string_index[i + 1]], 'utf-8')
+        for i in range(len(string_index) - 1)
+    ]
+    names = [strings[name_id] for name_id in sections['names']]
+    years = list(sections['years'])
+    columns = {metric: sections[f'col:{metric}'] for metric in header['columns']}
+
+    categories = subtotals = None
+    if 'categories' in sections:
+        categories = [None if category_id == NO_CATEGORY else strings[category_id] for category_id in sections['categories']]
+        subtotals = sections['subtotals']
+
+    dataset = Dataset(header['endpoint'], schema, names, years, columns, sections['cells'], categories, subtotals)
+    return dataset, header['meta']
@@ -0,0 +1,60 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """Lock exclusivo entre processos (e threads) baseado em um arquivo .lock
+
+    Com blocking=False não espera: o valor do bloco indica se o lock foi obtido.
+    """
+    with open(path, 'a') as lock_file:
+        acquired = True
+        if fcntl is not None:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file.fileno(), flags)
+            except BlockingIOError:
+                acquired = False
+        try:
+            yield acquired
+        finally:
+            if acquired and fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def hold_file_lock(path):
+    """Tenta obter, sem esperar, um lock mantido enquanto o arquivo retornado estiver aberto
+
+    Retorna None quando outro processo já detém o lock.
+    """
+    lock_file = open(path, 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+    return lock_file
+
+@contextmanager
+def atomic_write(path, mode='wb', **kwargs):
+    """Escreve em um arquivo temporário e o renomeia sobre o destino ao final
+
+    Leitores nunca veem um arquivo truncado ou pela metade: enxergam o conteúdo antigo
+    ou o novo por completo.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,141 @@
+import hashlib
+from functools import wraps
+from flask import request, current_app, make_response
+from app.services.embrapa_service import EmbrapaService, ENDPOINT_MAPPING, DATASET_REGISTRY
+from app.services.dataset_query import QUERY_OPTIONS
+from app.services.dataset_store import dataset_store
+from app.services.response_cache import get_response_cache
+from app.utils.pagination import get_pagination_params
+
+def set_cache_headers(response, datasets):
+    """Cache-Control e Last-Modified a partir dos snapshots dos datasets usados na resposta
+
+    `max-age` é o tempo que falta para o dataset mais próximo de expirar em memória e
+    Last-Modified é a gravação mais recente entre os snapshots.
+    """
+    service = EmbrapaService()
+    max_age = None
+    last_modified = None
+    for name in datasets:
+        entry = dataset_store.get_entry(name)
+        if entry is None:
+            continue
+        remaining = max(0, int(service.get_timeout(name) - entry.age()))
+        max_age = remaining if max_age is None else min(max_age, remaining)
+        modified = service.get_last_modified(name, entry)
+        last_modified = modified if last_modified is None else max(last_modified, modified)
+
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age or 0
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+def not_modified(etag, datasets=()):
+    """Resposta 304 quando o cliente já tem a versão identificada pelo ETag (None caso contrário)"""
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return set_cache_headers(response, datasets)
+    return None
+
+def catalog_response(catalog, key):
+    """Serve um catálogo pré-calculado com ETag forte, respondendo 304 sem serializar nada"""
+    etag = catalog.etag(key)
+    datasets = (catalog.endpoint,)
+    response = not_modified(etag, datasets)
+    if response is not None:
+        return response
+
+    body = catalog.encoded(key, current_app.json.dumps)
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return set_cache_headers(response, datasets)
+
+def documented_params(f):
+    """Parâmetros de query declarados na especificação swagger da rota"""
+    specs = getattr(f, 'specs_dict', None) or {}
+    return frozenset(parameter['name'] for parameter in specs.get('parameters', ()) if parameter.get('in') == 'query')
+
+def query_params(documented, datasets):
+    """Parâmetros que a rota lê: os documentados, as opções de paginação/projeção e os filtros dos datasets"""
+    params = set(documented) | QUERY_OPTIONS
+    for name in datasets:
+        params.update(DATASET_REGISTRY[name].filters)
+    return params
+
+def normalized_query(params):
+    """Parâmetros da requisição em forma canônica: só os que a rota lê (`params`), ordenados e
+    com a paginação padrão aplicada
+
+    Parâmetros desconhecidos ficam fora da chave, para não fragmentar o cache nem os ETags.
+    """
+    query = {name: tuple(request.args.getlist(name)) for name in request.args if name in params}
+    page, per_page = get_pagination_params()
+    query['page'] = (str(page),)
+    query['per_page'] = (str(per_page),)
+    return tuple(sorted(query.items()))
+
+def response_etag(key):
+    """ETag forte de uma resposta: hash da chave (rota, consulta normalizada e versões dos datasets)"""
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32]
+
+def current_versions(names):
+    """Versões publicadas agora dos datasets (None para um dataset que saiu da memória)"""
+    entries = [dataset_store.get_entry(name) for name in names]
+    return tuple(entry.data.version if entry is not None else None for entry in entries)
+
+def cached_response(*datasets):
+    """Decorator para as rotas de dados: respostas condicionais (ETag) e cache LRU de respostas
+
+    A chave é a rota, a consulta normalizada e a versão de cada dataset usado (`datasets`, ou o
+    parâmetro `dataset` da URL), então uma atualização dos dados nunca serve uma resposta antiga.
+    A consulta normalizada só tem os parâmetros que a rota lê (os da especificação swagger, as
+    opções de paginação e os filtros dos datasets). Um `If-None-Match` com o ETag da chave recebe
+    304 antes de qualquer filtro ou serialização. Só respostas 200 são guardadas, e só quando as
+    versões dos datasets não mudaram enquanto a resposta era montada.
+    """
+    def decorator(f):
+        documented = documented_params(f)
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            names = datasets or (kwargs.get('dataset'),)
+            if any(name not in ENDPOINT_MAPPING for name in names):
+                return f(*args, **kwargs)
+
+            service = EmbrapaService()
+            versions = tuple(service.get_data(name).version for name in names)
+            params = query_params(documented, names)
+            key = (request.endpoint, tuple(sorted(kwargs.items())), normalized_query(params), versions)
+            etag = response_etag(key)
+
+            # Com parâmetros que a rota não conhece (a consulta os rejeita), a resposta não sai do cache
+            known = all(name in params for name in request.args)
+            response = not_modified(etag, names) if known else None
+            if response is not None:
+                return response
+
+            enabled = current_app.config['RESPONSE_CACHE_ENABLED']
+            cache = get_response_cache(current_app.config) if enabled else None
+            cached = cache.get(key) if enabled and known else None
+            if cached is not None:
+                body, mimetype = cached
+                response = current_app.response_class(body, mimetype=mimetype)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if current_versions(names) != versions:
+                    # Um dataset foi trocado durante a requisição: a resposta pode ser da versão
+                    # nova e não é guardada nem marcada com o ETag da anterior
+                    return set_cache_headers(response, names)
+                if enabled:
+                    cache.put(key, names, response.get_data(), response.mimetype)
+
+            response.set_etag(etag)
+            return set_cache_headers(response, names)
+
+        return decorated
+
+    return decorator
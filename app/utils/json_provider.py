@@ -0,0 +1,81 @@
+import json
+from flask.json.provider import DefaultJSONProvider
+from app.services.dataset_index import DatasetView
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional
+    orjson = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Provider JSON do Flask com orjson (quando instalado) e registros pré-codificados
+
+    As respostas são sempre geradas em bytes, no formato compacto. Uma visão de dataset
+    (`DatasetView`) no primeiro nível da resposta, como a página de uma listagem, é escrita juntando
+    o JSON de cada registro, codificado uma única vez por versão do dataset, dentro do envelope.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, DatasetView):
+            return list(o)
+        return DefaultJSONProvider.default(o)
+
+    def encode(self, obj):
+        """Serializa um objeto em bytes (JSON compacto)"""
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return orjson.dumps(obj, default=self.default, option=option)
+        return json.dumps(
+            obj,
+            default=self.default,
+            ensure_ascii=self.ensure_ascii,
+            sort_keys=self.sort_keys,
+            separators=(',', ':')
+        ).encode('utf-8')
+
+    def encode_view(self, view):
+        """Lista JSON de uma visão; sem projeção, o JSON de cada registro vem do cache do dataset"""
+        dataset = view.dataset
+        if view.record != dataset.record:
+            return b'[' + b','.join(self.encode(view.record(row)) for row in view.rows) + b']'
+
+        fragments = dataset.encoded_records()
+        parts = []
+        for row in view.rows:
+            fragment = fragments[row]
+            if fragment is None:
+                fragment = fragments[row] = self.encode(dataset.record(row))
+            parts.append(fragment)
+        return b'[' + b','.join(parts) + b']'
+
+    def encode_response(self, obj):
+        """Serializa a resposta, trocando as visões do primeiro nível pelas listas já codificadas"""
+        if not isinstance(obj, dict):
+            return self.encode(obj)
+
+        views = {}
+        envelope = dict(obj)
+        for key, value in obj.items():
+            if isinstance(value, DatasetView):
+                # Marcador que não aparece em dados reais, substituído depois de serializar o envelope
+                marker = f'\x00{len(views)}\x00'
+                views[marker] = value
+                envelope[key] = marker
+        body = self.encode(envelope)
+        for marker, view in views.items():
+            body = body.replace(self.encode(marker), self.encode_view(view), 1)
+        return body
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode_response(obj) + b'\n', mimetype=self.mimetype)
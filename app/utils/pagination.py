@@ -1,5 +1,18 @@
 from flask import request, current_app
 from math import ceil
+from itertools import islice
+import base64
+import binascii
+from app.services.dataset_index import DatasetView
+from app.services.dataset_query import compile_plan, parse_bool
+from app.services.embrapa_service import DATASET_REGISTRY
+from app.services.dataset_sort import parse_sort
+
+class InvalidParameter(ValueError):
+    """Parâmetro de consulta inválido (resposta 400)"""
+
+class InvalidCursor(InvalidParameter):
+    """Cursor de paginação inválido ou emitido para uma versão anterior dos dados"""
 
 def get_pagination_params():
     """Extrai parâmetros de paginação da requisição"""
@@ -15,7 +28,7 @@ def get_pagination_params():
     return page, per_page
 
 def paginate_data(data, page, per_page):
-    """Pagina uma lista de dados"""
+    """Pagina uma lista de dados; com um dataset ou visão filtrada, só os registros da página são montados"""
     total = len(data)
     start = (page - 1) * per_page
     end = start + per_page
@@ -34,19 +47,166 @@ def paginate_data(data, page, per_page):
         }
     }
 
+def query_plan(dataset, filters):
+    """Plano compilado (e reaproveitado por formato de consulta) para os filtros do dataset"""
+    return compile_plan(DATASET_REGISTRY[dataset.endpoint], filters)
+
+def select_rows(dataset, filters):
+    """Posições do dataset que atendem aos filtros (None quando não há filtro)"""
+    return query_plan(dataset, filters).select(dataset, filters)
+
+def encode_cursor(version, position):
+    """Cursor opaco: versão do dataset e posição do próximo registro"""
+    return base64.urlsafe_b64encode(f'{version}:{position}'.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, version, size):
+    """Posição onde a página começa; cursor vazio é o início dos dados
+
+    A posição precisa estar entre 0 e `size` (o número de registros do dataset), inclusive.
+    """
+    if not cursor:
+        return 0
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        cursor_version, position = decoded.split(':')
+        position = int(position)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor('Cursor inválido')
+    if cursor_version != version:
+        raise InvalidCursor('Cursor expirado: os dados foram atualizados, recomece a paginação sem cursor')
+    if not 0 <= position <= size:
+        raise InvalidCursor('Cursor inválido')
+    return position
+
+def paginate_cursor(dataset, filters, cursor, per_page, count=False, sort=(), record=None):
+    """Página a partir de um cursor, lendo apenas os registros da página
+    
+    O cursor guarda o rank do próximo registro na ordem da consulta (a posição original, sem
+    `sort`). Sem ordenação o índice é percorrido sob demanda e o total vem da cardinalidade dos
+    índices; quando ele exige interseção de filtros (ano e nome, faixas de valores) só é
+    calculado se pedido (`count=true`).
+    """
+    plan = query_plan(dataset, filters)
+    start = decode_cursor(cursor, dataset.version, len(dataset))
+    
+    if sort:
+        sorter = dataset.sorter
+        ordered = sorter.sort_rows(plan.select(dataset, filters), sort)
+        offset = sorter.seek(ordered, sort, start)
+        rows = list(ordered[offset:offset + per_page + 1])
+        rank = sorter.order(sort)[1]
+        total = len(ordered)
+    else:
+        rows = list(islice(plan.iter(dataset, filters, start), per_page + 1))
+        rank = None
+        total = plan.count(dataset, filters, exact=count)
+    
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = None
+    if has_next:
+        next_cursor = encode_cursor(dataset.version, (rank[rows[-1]] if rank else rows[-1]) + 1)
+    
+    record = record or dataset.record
+    return {
+        'data': DatasetView(dataset, rows, record),
+        'pagination': {
+            'per_page': per_page,
+            'cursor': cursor or None,
+            'next_cursor': next_cursor,
+            'has_next': has_next,
+            'total': total
+        }
+    }
+
+def get_projection_params(dataset):
+    """Campos pedidos em `fields` (None para todos) e se os campos constantes ficam nos registros
+    
+    Com `compact=true` os campos constantes do dataset (unidade, tipo) saem dos registros e vão
+    uma única vez para o envelope da resposta, em `constantes`.
+    """
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    invalid = [field for field in fields if field not in dataset.fields]
+    if invalid:
+        raise InvalidParameter(f'Campo inválido em fields: {", ".join(invalid)}; use: {", ".join(dataset.fields)}')
+    compact = request.args.get('compact', 'false').lower() == 'true'
+    return fields or None, not compact
+
+def hoisted_constants(dataset, fields):
+    """Campos constantes enviados no envelope quando `compact=true`"""
+    return {key: value for key, value in dataset.constants.items() if not fields or key in fields}
+
+def get_sort_param(dataset):
+    """Ordenação pedida em `sort` (ex.: -quantidade,ano), validada contra os campos do dataset"""
+    try:
+        return parse_sort(request.args.get('sort'), dataset.sorter.fields)
+    except ValueError as e:
+        raise InvalidParameter(str(e))
+
+def paginate_request(data, filters, page, per_page):
+    """Pagina um dataset filtrado (e ordenado): por cursor quando a requisição traz `cursor`, senão por página"""
+    sort = get_sort_param(data)
+    fields, constants = get_projection_params(data)
+    record = data.projection(fields, constants)
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        count = request.args.get('count', 'false').lower() == 'true'
+        result = paginate_cursor(data, filters, cursor, per_page, count, sort, record)
+    else:
+        rows = query_plan(data, filters).select(data, filters)
+        if sort:
+            rows = data.sorter.sort_rows(rows, sort)
+        if rows is None:
+            rows = range(len(data))
+        result = paginate_data(DatasetView(data, rows, record), page, per_page)
+    
+    if not constants:
+        result['constantes'] = hoisted_constants(data, fields)
+    return result
+
+def parse_int_list(value):
+    """Converte uma lista separada por vírgulas em inteiros, ignorando valores inválidos"""
+    values = []
+    for part in value.split(','):
+        try:
+            values.append(int(part.strip()))
+        except ValueError:
+            continue
+    return values
+
 def get_filter_params():
-    """Extrai parâmetros de filtro da requisição"""
+    """Extrai parâmetros de filtro da requisição
+    
+    Os filtros por nome (produto, cultivar, pais) também aceitam vários valores separados por vírgula.
+    """
     filters = {}
     
     # Filtros comuns
-    ano = request.args.get('ano', type=int)
-    if ano:
-        filters['ano'] = ano
+    # ano aceita vários valores separados por vírgula (ex.: ano=2019,2020)
+    anos = parse_int_list(request.args.get('ano', ''))
+    if anos:
+        filters['ano'] = anos
+    
+    ano_inicio = request.args.get('ano_inicio', type=int)
+    if ano_inicio is not None:
+        filters['ano_inicio'] = ano_inicio
+    
+    ano_fim = request.args.get('ano_fim', type=int)
+    if ano_fim is not None:
+        filters['ano_fim'] = ano_fim
     
     categoria = request.args.get('categoria')
     if categoria:
         filters['categoria'] = categoria
     
+    # subtotal=false deixa só os itens; subtotal=true, só os totais de cada categoria
+    subtotal = request.args.get('subtotal')
+    if subtotal:
+        try:
+            filters['subtotal'] = parse_bool(subtotal)
+        except ValueError:
+            pass
+    
     produto = request.args.get('produto')
     if produto:
         filters['produto'] = produto
@@ -0,0 +1,18 @@
+import os
+
+# Configuração do gunicorn (lida automaticamente a partir do diretório de trabalho)
+# bind, workers, threads e timeout só mudam quando a variável correspondente está definida;
+# sem elas valem os padrões do gunicorn (e o --bind da linha de comando, como no Dockerfile)
+if 'GUNICORN_BIND' in os.environ:
+    bind = os.environ['GUNICORN_BIND']
+if 'WEB_CONCURRENCY' in os.environ:
+    workers = int(os.environ['WEB_CONCURRENCY'])
+if 'GUNICORN_THREADS' in os.environ:
+    threads = int(os.environ['GUNICORN_THREADS'])
+if 'GUNICORN_TIMEOUT' in os.environ:
+    timeout = int(os.environ['GUNICORN_TIMEOUT'])
+
+# Com preload a aplicação (e o aquecimento dos datasets, se DATASET_WARM_ON_STARTUP) é carregada
+# uma única vez no processo master; os workers herdam os dados e, no modo compartilhado
+# (DATASET_SHARED_MODE), leem os snapshots mapeados em memória sem cópia
+preload_app = os.environ.get('GUNICORN_PRELOAD', os.environ.get('DATASET_SHARED_MODE', 'false')).lower() in ('1', 'true', 'yes', 'on')